@@ -0,0 +1,150 @@
+import json
+from pathlib import Path
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def _to_unit_vectors(lats, lngs):
+    """緯度経度（度）を単位球上の3次元座標に変換"""
+    import numpy as np
+
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lng = np.radians(np.asarray(lngs, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)])
+
+
+class OfflineReverseGeocoder:
+    def __init__(self, gazetteer_file, cache_file=None, max_distance_km=20.0):
+        """GeoNames形式の地名ファイルを使ったオフライン逆ジオコーダー
+
+        gazetteer_file: GeoNamesのダンプ（cities500.txt など、タブ区切り）
+        cache_file: placeIDごとの結果を保存するJSONファイル
+        max_distance_km: これより遠い地名しかない場合は解決しない
+        """
+        self.gazetteer_file = gazetteer_file
+        self.max_distance_km = max_distance_km
+        self.cache_file = cache_file
+        self.cache = {}
+
+        # 地名データとKD木はキャッシュに無い場所が出たときに初めて作る
+        self.names = None
+        self.countries = None
+        self.tree = None
+
+        stat = Path(gazetteer_file).stat()
+        # 地名ファイルや距離の上限が変わったら古いキャッシュは使わない
+        self.cache_source = {
+            'gazetteer': str(Path(gazetteer_file).resolve()),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'max_distance_km': max_distance_km,
+        }
+        if cache_file and Path(cache_file).exists():
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get('source') == self.cache_source:
+                self.cache = data.get('places', {})
+
+    def _ensure_tree(self):
+        """地名ファイルを読み込んでKD木を作成（初回のみ）"""
+        if self.tree is not None:
+            return
+        # numpy / scipy はキャッシュだけで済む場合は読み込まない
+        from scipy.spatial import cKDTree
+
+        self.names, self.countries, lats, lngs = self._load_gazetteer(self.gazetteer_file)
+        # 単位球上の直交座標でKD木を作ると弦距離で最近傍が求まる
+        self.tree = cKDTree(_to_unit_vectors(lats, lngs))
+
+    def _load_gazetteer(self, gazetteer_file):
+        """地名ファイルを読み込む（名前, 国コード, 緯度, 経度）"""
+        import numpy as np
+
+        names = []
+        countries = []
+        lats = []
+        lngs = []
+        with open(gazetteer_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) < 9:
+                    continue
+                try:
+                    lat, lng = float(fields[4]), float(fields[5])
+                except ValueError:
+                    continue
+                names.append(fields[1])
+                countries.append(fields[8])
+                lats.append(lat)
+                lngs.append(lng)
+
+        if not names:
+            raise ValueError(f"地名データを読み込めませんでした: {gazetteer_file}")
+        return names, countries, np.array(lats), np.array(lngs)
+
+    def lookup(self, lats, lngs):
+        """座標配列を一括で最寄りの地名に変換
+
+        戻り値は (地名のリスト, 国コードのリスト, 距離(km)の配列)。
+        max_distance_km を超える座標の地名は None になる。
+        """
+        import numpy as np
+
+        self._ensure_tree()
+        chord, index = self.tree.query(_to_unit_vectors(lats, lngs))
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+        names = []
+        countries = []
+        for i, distance in zip(index, distances):
+            if distance <= self.max_distance_km:
+                names.append(self.names[i])
+                countries.append(self.countries[i])
+            else:
+                names.append(None)
+                countries.append(None)
+        return names, countries, distances
+
+    def _cache_key(self, place):
+        """キャッシュのキー（placeIDがなければ座標）"""
+        return place.get('place_id') or f"{place['lat']:.5f},{place['lng']:.5f}"
+
+    def label_places(self, places):
+        """名前・住所のない訪問場所に地名を付ける（placeIDごとにキャッシュ）"""
+        targets = [p for p in places if p['name'] in ('', 'Unknown') or not p['address']]
+        if not targets:
+            return 0
+
+        # キャッシュにない場所だけまとめて検索
+        missing = {}
+        for place in targets:
+            key = self._cache_key(place)
+            if key not in self.cache and key not in missing:
+                missing[key] = place
+
+        if missing:
+            uncached = list(missing.values())
+            names, countries, _ = self.lookup([p['lat'] for p in uncached], [p['lng'] for p in uncached])
+            for key, name, country in zip(missing, names, countries):
+                self.cache[key] = {'name': name, 'country': country}
+            self.save_cache()
+
+        labeled = 0
+        for place in targets:
+            entry = self.cache[self._cache_key(place)]
+            if not entry['name']:
+                continue
+            if place['name'] in ('', 'Unknown'):
+                place['name'] = entry['name']
+            if not place['address']:
+                place['address'] = f"{entry['name']}, {entry['country']}"
+            labeled += 1
+        return labeled
+
+    def save_cache(self):
+        """キャッシュをJSONファイルに保存"""
+        if not self.cache_file:
+            return
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump({'source': self.cache_source, 'places': self.cache}, f, ensure_ascii=False)
@@ -1,7 +1,5 @@
 import json
-import folium
 from datetime import datetime
-import numpy as np
 
 class SimpleTravelMap:
     def __init__(self, timeline_file):
@@ -35,7 +33,8 @@ class SimpleTravelMap:
                             'lat': lat,
                             'lng': lng,
                             'time': item.get('startTime', ''),
-                            'address': candidate.get('address', '')
+                            'address': candidate.get('address', ''),
+                            'place_id': candidate.get('placeID', '')
                         })
             
             # Records形式: activity (移動)
@@ -70,7 +69,8 @@ class SimpleTravelMap:
                     'lat': location.get('latitudeE7', 0) / 1e7,
                     'lng': location.get('longitudeE7', 0) / 1e7,
                     'time': place.get('duration', {}).get('startTimestamp', ''),
-                    'address': location.get('address', '')
+                    'address': location.get('address', ''),
+                    'place_id': location.get('placeId', '')
                 })
             
             # 従来のactivitySegment形式もサポート
@@ -85,8 +85,19 @@ class SimpleTravelMap:
                         'type': segment.get('activityType', 'UNKNOWN')
                     })
     
+    def label_unknown_places(self, gazetteer_file, cache_file=None):
+        """名前のない訪問場所にオフラインの地名データで名前を付ける"""
+        from offline_geocoder import OfflineReverseGeocoder
+        
+        geocoder = OfflineReverseGeocoder(gazetteer_file, cache_file)
+        return geocoder.label_places(self.places)
+    
     def create_map(self, start_date=None, end_date=None, show_routes=True):
         """旅行マップを作成"""
+        # folium / numpy は描画時にのみ必要なためここで読み込む
+        import folium
+        import numpy as np
+        
         # 日付でフィルター
         filtered_places = self.filter_by_date(start_date, end_date)
         
@@ -210,7 +221,8 @@ class SimpleTravelMap:
 
 # 使用例
 def create_travel_map(json_file, output_file='travel_map.html', 
-                     start_date=None, end_date=None):
+                     start_date=None, end_date=None,
+                     gazetteer_file=None, geocode_cache_file=None):
     """
     使いやすい関数版
     
@@ -219,9 +231,14 @@ def create_travel_map(json_file, output_file='travel_map.html',
     output_file: 出力HTMLファイル名
     start_date: 開始日 (datetime.date形式)
     end_date: 終了日 (datetime.date形式)
+    gazetteer_file: 名前のない場所に使う地名ファイル (GeoNames形式、省略可)
+    geocode_cache_file: 地名検索結果のキャッシュJSON (省略可)
     """
     
     travel_map = SimpleTravelMap(json_file)
+    if gazetteer_file:
+        labeled = travel_map.label_unknown_places(gazetteer_file, geocode_cache_file)
+        print(f"📍 {labeled}箇所に地名を付けました")
     map_obj = travel_map.create_map(start_date, end_date)
     
     if map_obj:
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""rekordboxコレクションとタイムラインを常駐メモリに保持するローカル検索サーバー
+
+XML/JSONの読み込みは起動時とファイル更新時だけ行い、各リクエストは
+読み込み済みの索引から応答する。localhost のみで待ち受ける。
+
+エンドポイント（すべて GET）:
+    /track?id=TrackID
+    /track?path=ファイルパスまたはLocation
+    /tracks?artist=...&name=...&limit=...
+    /playlists                    プレイリスト一覧
+    /playlists?track_id=TrackID   指定曲を含むプレイリスト
+    /playlists?path=Folder/List   プレイリストの曲
+    /timeline/places?start=YYYY-MM-DD&end=YYYY-MM-DD
+    /timeline/map?start=YYYY-MM-DD&end=YYYY-MM-DD   (HTML)
+"""
+import asyncio
+import json
+import os
+import sys
+import urllib.parse
+from datetime import date
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT_DIR / 'rekordbox_analyzer'))
+sys.path.insert(0, str(ROOT_DIR / 'create_map_timeline'))
+
+from rekordbox_xml_parser import RekordboxXMLParser
+from find_track_by_filepath import normalize_filepath
+from simple_travel_map import SimpleTravelMap
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class CollectionIndex:
+    def __init__(self, xml_file_path: str):
+        """rekordboxコレクションを読み込み、検索用の索引を作る"""
+        self.parser = RekordboxXMLParser(xml_file_path)
+        self.tracks = self.parser.get_all_tracks()
+        self.tracks_by_id = {track['TrackID']: track for track in self.tracks}
+        self.tracks_by_location = {}
+        for track in self.tracks:
+            if track.get('Location'):
+                self.tracks_by_location[normalize_filepath(track['Location'])] = track
+
+    def find_by_path(self, file_path: str):
+        """ファイルパスまたはLocationで曲を検索"""
+        return self.tracks_by_location.get(normalize_filepath(file_path))
+
+
+class WatchedSource:
+    def __init__(self, file_path: str, loader):
+        """ファイルと、その読み込み結果（更新日時が変わったら読み直す）"""
+        self.file_path = file_path
+        self.loader = loader
+        self.mtime = None
+        self.value = None
+        self.error = None
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.file_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload_if_changed(self) -> bool:
+        """更新されていれば読み直す（失敗した場合は前回の内容を保持）"""
+        mtime = self._current_mtime()
+        if mtime is None or mtime == self.mtime:
+            return False
+        try:
+            value = self.loader(self.file_path)
+        except Exception as e:
+            self.error = str(e)
+            print(f"❌ 読み込みに失敗しました: {self.file_path} ({e})")
+            return False
+        self.value = value
+        self.mtime = mtime
+        self.error = None
+        print(f"🔄 読み込みました: {self.file_path}")
+        return True
+
+
+def _parse_date_param(params, name):
+    """クエリパラメータの日付を読み込む"""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise RequestError(400, f"{name} は YYYY-MM-DD 形式で指定してください")
+
+
+class QueryServer:
+    def __init__(self, xml_file_path=None, timeline_file=None, host='127.0.0.1', port=8765,
+                 poll_interval=2.0, gazetteer_file=None, geocode_cache_file=None):
+        """常駐型のローカル検索サーバー
+
+        gazetteer_file を指定すると、タイムラインの読み込み時に名前のない場所へ地名を付ける。
+        """
+        self.host = host
+        self.port = port
+        self.poll_interval = poll_interval
+        self.gazetteer_file = gazetteer_file
+        self.geocode_cache_file = geocode_cache_file
+        self.collection = WatchedSource(xml_file_path, CollectionIndex) if xml_file_path else None
+        self.timeline = WatchedSource(timeline_file, self._load_timeline) if timeline_file else None
+
+    def _load_timeline(self, timeline_file):
+        """タイムラインを読み込み、必要なら地名を付ける"""
+        travel_map = SimpleTravelMap(timeline_file)
+        if self.gazetteer_file:
+            travel_map.label_unknown_places(self.gazetteer_file, self.geocode_cache_file)
+        return travel_map
+
+    def _sources(self):
+        return [source for source in (self.collection, self.timeline) if source]
+
+    def _require(self, source, label):
+        """読み込み済みのデータを返す（未設定・未読み込みなら503）"""
+        if source is None or source.value is None:
+            raise RequestError(503, f"{label}が読み込まれていません")
+        return source.value
+
+    # ---- ハンドラー ----
+
+    def handle_track(self, params):
+        index = self._require(self.collection, "rekordboxコレクション")
+        if params.get('id'):
+            track = index.tracks_by_id.get(params['id'])
+        elif params.get('path'):
+            track = index.find_by_path(params['path'])
+        else:
+            raise RequestError(400, "id または path を指定してください")
+        if track is None:
+            raise RequestError(404, "該当する楽曲が見つかりませんでした")
+        return track
+
+    def handle_tracks(self, params):
+        index = self._require(self.collection, "rekordboxコレクション")
+        artist = params.get('artist', '').lower()
+        name = params.get('name', '').lower()
+        try:
+            limit = int(params.get('limit', 100))
+        except ValueError:
+            raise RequestError(400, "limit は整数で指定してください")
+        results = [track for track in index.tracks
+                   if artist in track['Artist'].lower() and name in track['Name'].lower()]
+        return {'count': len(results), 'tracks': results[:limit]}
+
+    def handle_playlists(self, params):
+        index = self._require(self.collection, "rekordboxコレクション")
+        parser = index.parser
+        if params.get('track_id'):
+            return {'playlists': parser.get_playlists_for_track(params['track_id'])}
+        if params.get('path'):
+            try:
+                track_ids = parser.get_playlist_track_ids(params['path'])
+            except KeyError as e:
+                raise RequestError(404, str(e))
+            return {'tracks': [index.tracks_by_id[t] for t in track_ids if t in index.tracks_by_id]}
+        return {'playlists': {path: len(ids) for path, ids in parser.playlists.items()}}
+
+    def handle_places(self, params):
+        travel_map = self._require(self.timeline, "タイムライン")
+        places = travel_map.filter_by_date(_parse_date_param(params, 'start'), _parse_date_param(params, 'end'))
+        return {'count': len(places), 'places': places}
+
+    def handle_map(self, params):
+        travel_map = self._require(self.timeline, "タイムライン")
+        map_obj = travel_map.create_map(_parse_date_param(params, 'start'), _parse_date_param(params, 'end'))
+        if map_obj is None:
+            raise RequestError(404, "指定期間にデータがありません")
+        return map_obj.get_root().render()
+
+    ROUTES = {
+        '/track': 'handle_track',
+        '/tracks': 'handle_tracks',
+        '/playlists': 'handle_playlists',
+        '/timeline/places': 'handle_places',
+        '/timeline/map': 'handle_map',
+    }
+
+    # ---- HTTP ----
+
+    async def _respond(self, writer, status, body, content_type):
+        payload = body.encode('utf-8')
+        header = (f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                  f"Content-Type: {content_type}; charset=utf-8\r\n"
+                  f"Content-Length: {len(payload)}\r\n"
+                  f"Connection: close\r\n\r\n")
+        writer.write(header.encode('ascii') + payload)
+        await writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        """1リクエストを処理（重い処理はスレッドプールで実行）"""
+        try:
+            request_line = (await reader.readline()).decode('latin-1').strip()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+
+            parts = request_line.split()
+            if len(parts) < 2:
+                raise RequestError(400, "不正なリクエストです")
+            if parts[0] != 'GET':
+                raise RequestError(405, "GET のみ対応しています")
+
+            url = urllib.parse.urlsplit(parts[1])
+            params = dict(urllib.parse.parse_qsl(url.query))
+            handler_name = self.ROUTES.get(url.path)
+            if handler_name is None:
+                raise RequestError(404, f"不明なパスです: {url.path}")
+
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(None, getattr(self, handler_name), params)
+            if isinstance(result, str):
+                await self._respond(writer, 200, result, 'text/html')
+            else:
+                await self._respond(writer, 200, json.dumps(result, ensure_ascii=False), 'application/json')
+        except RequestError as e:
+            await self._respond(writer, e.status, json.dumps({'error': str(e)}, ensure_ascii=False),
+                                'application/json')
+        except Exception as e:
+            await self._respond(writer, 500, json.dumps({'error': str(e)}, ensure_ascii=False),
+                                'application/json')
+        finally:
+            writer.close()
+
+    async def watch_sources(self):
+        """ファイルの更新を監視して変更されたものだけ読み直す"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            for source in self._sources():
+                await loop.run_in_executor(None, source.reload_if_changed)
+
+    async def serve(self):
+        """データを読み込んでサーバーを起動"""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(None, source.reload_if_changed)
+                               for source in self._sources()))
+
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        print(f"🚀 http://{self.host}:{self.port}/ で待ち受けています")
+        watcher = asyncio.create_task(self.watch_sources())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("\n👋 サーバーを停止しました")
+
+
+if __name__ == "__main__":
+    QueryServer(
+        xml_file_path="rekordbox_analyzer/rekordbox_xml/collections.xml",
+        timeline_file="create_map_timeline/location-history.json",
+    ).run()
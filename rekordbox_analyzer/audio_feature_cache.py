@@ -0,0 +1,73 @@
+import numpy as np
+import hashlib
+from pathlib import Path
+from typing import Dict, Optional
+
+from audio_spectrum_visualizer import AudioSpectrumVisualizer, location_to_path
+
+
+class AudioFeatureCache:
+    # キャッシュ形式を変えた場合はバージョンを上げて古いキャッシュを無効化する
+    CACHE_VERSION = 2
+
+    def __init__(self, cache_dir: str = "feature_cache", hop_length: int = 512):
+        """解析用オーディオ特徴量（オンセット強度・RMS・クロマ・メル）をnpzでキャッシュする"""
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hop_length = hop_length
+        self.visualizer = AudioSpectrumVisualizer()
+
+    def _cache_path(self, file_path: str) -> Path:
+        """ファイルパス・更新日時・サイズからキャッシュファイル名を決める"""
+        stat = Path(file_path).stat()
+        key = f"{self.CACHE_VERSION}:{self.hop_length}:{file_path}:{stat.st_mtime_ns}:{stat.st_size}"
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{digest}.npz"
+
+    def compute_features(self, y: np.ndarray, sr: int) -> Dict[str, np.ndarray]:
+        """波形から特徴量を計算"""
+        import librosa
+
+        hop_length = self.hop_length
+        onset_env = librosa.onset.onset_strength(y=y, sr=sr, hop_length=hop_length)
+        rms = librosa.feature.rms(y=y, hop_length=hop_length)[0]
+        chroma, _ = self.visualizer.create_chromagram(y, sr, hop_length=hop_length)
+        mel_spec_db, _ = self.visualizer.create_mel_spectrogram(y, sr, hop_length=hop_length)
+
+        return {
+            'sr': np.int64(sr),
+            'hop_length': np.int64(hop_length),
+            'duration': np.float64(len(y) / sr),
+            'onset_env': onset_env.astype(np.float32),
+            'rms': rms.astype(np.float32),
+            'chroma': chroma.astype(np.float32),
+            'mel_spec_db': mel_spec_db.astype(np.float32),
+        }
+
+    def get_features(self, location: str) -> Dict[str, np.ndarray]:
+        """特徴量を取得（キャッシュがなければ計算して保存）"""
+        file_path = location_to_path(location)
+        if not Path(file_path).exists():
+            raise FileNotFoundError(f"オーディオファイルが見つかりません: {file_path}")
+
+        cache_path = self._cache_path(file_path)
+        if cache_path.exists():
+            with np.load(cache_path) as data:
+                return {name: data[name] for name in data.files}
+
+        y, sr = self.visualizer.load_audio(file_path)
+        features = self.compute_features(y, sr)
+        np.savez(cache_path, **features)
+        return features
+
+    def get_cached_features(self, location: str) -> Optional[Dict[str, np.ndarray]]:
+        """キャッシュ済みの特徴量のみ返す（未計算ならNone）"""
+        file_path = location_to_path(location)
+        if not Path(file_path).exists():
+            return None
+
+        cache_path = self._cache_path(file_path)
+        if not cache_path.exists():
+            return None
+        with np.load(cache_path) as data:
+            return {name: data[name] for name in data.files}
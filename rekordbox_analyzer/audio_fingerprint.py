@@ -0,0 +1,319 @@
+import numpy as np
+from pathlib import Path
+from scipy.ndimage import maximum_filter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from audio_spectrum_visualizer import AudioSpectrumVisualizer, location_to_path, path_to_location
+
+# 指紋計算用のパラメータ（変更すると既存インデックスと互換性がなくなる）
+FINGERPRINT_SR = 11025
+FINGERPRINT_N_FFT = 1024
+FINGERPRINT_HOP = 256
+PEAK_NEIGHBORHOOD = (15, 15)
+PEAK_THRESHOLD_DB = -50.0
+PEAK_WINDOW_FRAMES = round(FINGERPRINT_SR / FINGERPRINT_HOP)  # 約1秒
+PEAKS_PER_WINDOW = 8
+FAN_OUT = 3
+MAX_DELTA_FRAMES = 63
+
+
+def find_spectral_peaks(magnitude_db: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """スペクトログラムの局所最大点を (フレーム番号, 周波数ビン) として時間順に返す
+
+    指紋を小さく保つため、約1秒の区間ごとに強い順で PEAKS_PER_WINDOW 個までに絞る。
+    """
+    local_max = maximum_filter(magnitude_db, size=PEAK_NEIGHBORHOOD, mode='constant',
+                               cval=-np.inf) == magnitude_db
+    peaks = local_max & (magnitude_db > PEAK_THRESHOLD_DB)
+    freq_bins, frames = np.nonzero(peaks)
+
+    # 区間番号・強さの降順で並べ、各区間内の順位で上位だけを残す
+    windows = frames // PEAK_WINDOW_FRAMES
+    order = np.lexsort((-magnitude_db[freq_bins, frames], windows))
+    sorted_windows = windows[order]
+    rank = np.arange(len(order)) - np.searchsorted(sorted_windows, sorted_windows, side='left')
+    keep = order[rank < PEAKS_PER_WINDOW]
+
+    keep = keep[np.argsort(frames[keep], kind='stable')]
+    return frames[keep], freq_bins[keep]
+
+
+def peak_pair_hashes(frames: np.ndarray, freq_bins: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ピークの組から32bitハッシュとアンカー時刻（フレーム）を作成
+
+    ハッシュは アンカー周波数(10bit) | ターゲット周波数(10bit) | 時間差(6bit)。
+    """
+    frames = frames.astype(np.int64)
+    freq_bins = freq_bins.astype(np.int64)
+    hashes = []
+    offsets = []
+    for k in range(1, FAN_OUT + 1):
+        if len(frames) <= k:
+            break
+        delta = frames[k:] - frames[:-k]
+        mask = (delta > 0) & (delta <= MAX_DELTA_FRAMES)
+        hashes.append((freq_bins[:-k][mask] << 16) | (freq_bins[k:][mask] << 6) | delta[mask])
+        offsets.append(frames[:-k][mask])
+
+    if not hashes:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int32)
+    return np.concatenate(hashes).astype(np.uint32), np.concatenate(offsets).astype(np.int32)
+
+
+class AudioFingerprinter:
+    def __init__(self):
+        """スペクトルピークの組み合わせハッシュによる音響指紋を計算する"""
+        self.visualizer = AudioSpectrumVisualizer()
+
+    def fingerprint_signal(self, y: np.ndarray, sr: int) -> Tuple[np.ndarray, np.ndarray]:
+        """波形から指紋（ハッシュ配列, オフセット配列）を計算"""
+        magnitude_db, _, _ = self.visualizer.create_spectrogram(
+            y, sr, n_fft=FINGERPRINT_N_FFT, hop_length=FINGERPRINT_HOP)
+        frames, freq_bins = find_spectral_peaks(magnitude_db)
+        return peak_pair_hashes(frames, freq_bins)
+
+    def fingerprint_file(self, location: str) -> Tuple[np.ndarray, np.ndarray]:
+        """オーディオファイル（パスまたはLocation）から指紋を計算"""
+        y, sr = self.visualizer.load_audio(location, sr=FINGERPRINT_SR)
+        return self.fingerprint_signal(y, sr)
+
+
+class FingerprintIndex:
+    def __init__(self, max_bucket_size: int = 200):
+        """ハッシュ→(TrackID, オフセット) の転置インデックス
+
+        ハッシュはソート済み配列として保持し、np.searchsorted でまとめて引く。
+        max_bucket_size より多くの曲に現れるハッシュは識別力がないため照合に使わない。
+        """
+        self.max_bucket_size = max_bucket_size
+        self.track_ids: List[str] = []
+        self._pending: List[Tuple[np.ndarray, np.ndarray]] = []
+
+        self.hashes = np.empty(0, dtype=np.uint32)
+        self.offsets = np.empty(0, dtype=np.int32)
+        self.track_index = np.empty(0, dtype=np.int32)
+        self.track_starts = np.zeros(1, dtype=np.int64)
+        self._order = np.empty(0, dtype=np.int64)
+        self._sorted_hashes = np.empty(0, dtype=np.uint32)
+        self._bucket_hashes = np.empty(0, dtype=np.uint32)
+        self._bucket_track_counts = np.empty(0, dtype=np.int64)
+
+    def add(self, track_id: str, hashes: np.ndarray, offsets: np.ndarray):
+        """1曲分の指紋を追加（build() で反映）"""
+        self.track_ids.append(track_id)
+        self._pending.append((hashes.astype(np.uint32), offsets.astype(np.int32)))
+
+    def build(self):
+        """追加待ちの指紋を結合してソート済みインデックスを作り直す"""
+        if not self._pending:
+            return
+
+        first_new = len(self.track_ids) - len(self._pending)
+        counts = np.array([len(h) for h, _ in self._pending], dtype=np.int64)
+        new_index = np.repeat(np.arange(first_new, len(self.track_ids), dtype=np.int32), counts)
+
+        self.hashes = np.concatenate([self.hashes] + [h for h, _ in self._pending])
+        self.offsets = np.concatenate([self.offsets] + [o for _, o in self._pending])
+        self.track_index = np.concatenate([self.track_index, new_index])
+        self.track_starts = np.concatenate([self.track_starts, self.track_starts[-1] + np.cumsum(counts)])
+        self._pending = []
+
+        self._order = np.argsort(self.hashes, kind='stable')
+        self._sorted_hashes = self.hashes[self._order]
+
+        # ハッシュごとの出現曲数（同じ曲内の繰り返しは1曲として数える）。
+        # 安定ソートなので同じハッシュ内ではTrack番号が昇順に並ぶ
+        sorted_tracks = self.track_index[self._order]
+        new_hash = np.ones(len(self._sorted_hashes), dtype=bool)
+        new_hash[1:] = self._sorted_hashes[1:] != self._sorted_hashes[:-1]
+        new_pair = new_hash.copy()
+        new_pair[1:] |= sorted_tracks[1:] != sorted_tracks[:-1]
+        bucket_starts = np.nonzero(new_hash)[0]
+        self._bucket_hashes = self._sorted_hashes[bucket_starts]
+        self._bucket_track_counts = np.add.reduceat(new_pair.astype(np.int64), bucket_starts) \
+            if len(bucket_starts) else np.empty(0, dtype=np.int64)
+
+    def track_fingerprint(self, position: int) -> Tuple[np.ndarray, np.ndarray]:
+        """インデックス内の曲の指紋を取得"""
+        start, end = self.track_starts[position], self.track_starts[position + 1]
+        return self.hashes[start:end], self.offsets[start:end]
+
+    def query(self, hashes: np.ndarray, offsets: np.ndarray, min_matches: int = 20,
+              limit: int = 5) -> List[Tuple[str, int]]:
+        """指紋に一致する曲を (TrackID, 時間整合したハッシュ一致数) の降順で返す"""
+        if len(hashes) == 0 or len(self._sorted_hashes) == 0:
+            return []
+
+        lo = np.searchsorted(self._sorted_hashes, hashes, side='left')
+        hi = np.searchsorted(self._sorted_hashes, hashes, side='right')
+        counts = hi - lo
+
+        # 多くの曲に現れるハッシュは照合に使わない
+        bucket = np.clip(np.searchsorted(self._bucket_hashes, hashes), 0, len(self._bucket_hashes) - 1)
+        common = (self._bucket_hashes[bucket] == hashes) & (self._bucket_track_counts[bucket] > self.max_bucket_size)
+        counts[common] = 0
+        total = int(counts.sum())
+        if total == 0:
+            return []
+
+        # 各ハッシュの一致範囲を1本の配列に展開
+        query_pos = np.repeat(np.arange(len(hashes)), counts)
+        match_pos = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)
+        entries = self._order[match_pos]
+
+        tracks = self.track_index[entries].astype(np.int64)
+        delta = self.offsets[entries].astype(np.int64) - offsets[query_pos].astype(np.int64)
+
+        # 同じ時間差で一致したハッシュ数を曲ごとに数え、その最大値をスコアとする
+        keys = (tracks << 32) | (delta - delta.min())
+        unique_keys, key_counts = np.unique(keys, return_counts=True)
+        scores = np.zeros(len(self.track_ids), dtype=np.int64)
+        np.maximum.at(scores, unique_keys >> 32, key_counts)
+
+        candidates = np.nonzero(scores >= min_matches)[0]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')][:limit]
+        return [(self.track_ids[i], int(scores[i])) for i in candidates]
+
+    def find_duplicates(self, min_matches: int = 20) -> List[List[str]]:
+        """音響的に同一な曲のクラスタ（2曲以上）を返す"""
+        self.build()
+        position_of = {track_id: i for i, track_id in enumerate(self.track_ids)}
+        parent = np.arange(len(self.track_ids))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i in range(len(self.track_ids)):
+            hashes, offsets = self.track_fingerprint(i)
+            for track_id, _ in self.query(hashes, offsets, min_matches=min_matches, limit=10):
+                j = position_of[track_id]
+                if j != i:
+                    root_i, root_j = find(i), find(j)
+                    if root_i != root_j:
+                        parent[max(root_i, root_j)] = min(root_i, root_j)
+
+        clusters: Dict[int, List[str]] = {}
+        for i, track_id in enumerate(self.track_ids):
+            clusters.setdefault(find(i), []).append(track_id)
+        return [members for members in clusters.values() if len(members) > 1]
+
+    def save(self, file_path: str):
+        """インデックスをnpzで保存"""
+        self.build()
+        np.savez(file_path,
+                 track_ids=np.array(self.track_ids, dtype=str),
+                 hashes=self.hashes,
+                 offsets=self.offsets,
+                 track_starts=self.track_starts)
+
+    @classmethod
+    def load(cls, file_path: str, max_bucket_size: int = 200) -> 'FingerprintIndex':
+        """保存済みのインデックスを読み込む"""
+        index = cls(max_bucket_size=max_bucket_size)
+        with np.load(file_path) as data:
+            track_ids = list(data['track_ids'])
+            track_starts = data['track_starts']
+            hashes = data['hashes']
+            offsets = data['offsets']
+
+        for i, track_id in enumerate(track_ids):
+            start, end = track_starts[i], track_starts[i + 1]
+            index.add(str(track_id), hashes[start:end], offsets[start:end])
+        index.build()
+        return index
+
+
+class LibraryFingerprintIndexer:
+    def __init__(self, parser, index: Optional[FingerprintIndex] = None):
+        """rekordboxコレクション全体の指紋インデックスを作成・照合する"""
+        self.parser = parser
+        self.index = index or FingerprintIndex()
+        self.fingerprinter = AudioFingerprinter()
+
+    def index_library(self, tracks: Optional[List[Dict]] = None) -> int:
+        """Locationが存在する曲の指紋をインデックスに追加（追加数を返す）"""
+        if tracks is None:
+            tracks = self.parser.get_all_tracks()
+
+        indexed = set(self.index.track_ids)
+        added = 0
+        for track in tracks:
+            location = track.get('Location')
+            if not location or track['TrackID'] in indexed:
+                continue
+            if not Path(location_to_path(location)).exists():
+                continue
+            try:
+                hashes, offsets = self.fingerprinter.fingerprint_file(location)
+            except Exception as e:
+                print(f"❌ 指紋を計算できませんでした: {track['Name']} ({e})")
+                continue
+            self.index.add(track['TrackID'], hashes, offsets)
+            added += 1
+
+        self.index.build()
+        return added
+
+    def find_track_by_audio(self, file_path: str, min_matches: int = 20) -> Optional[Dict]:
+        """音声内容からコレクション内の曲を特定"""
+        hashes, offsets = self.fingerprinter.fingerprint_file(file_path)
+        matches = self.index.query(hashes, offsets, min_matches=min_matches, limit=1)
+        if not matches:
+            return None
+        return self.parser.get_track_by_id(matches[0][0])
+
+    def find_duplicate_tracks(self, min_matches: int = 20) -> List[List[Dict]]:
+        """重複曲のクラスタをトラック情報のリストとして返す"""
+        clusters = self.index.find_duplicates(min_matches=min_matches)
+        tracks_by_id = {t['TrackID']: t for t in self.parser.get_all_tracks()}
+        return [[tracks_by_id[track_id] for track_id in cluster if track_id in tracks_by_id]
+                for cluster in clusters]
+
+    def relink_stale_locations(self, candidate_files: Iterable[str],
+                               min_matches: int = 20) -> Dict[str, str]:
+        """Locationが存在しない曲を候補ファイルの音声内容で再リンク
+
+        戻り値は TrackID → 新しいLocation の辞書。
+        """
+        stale_ids = {t['TrackID'] for t in self.parser.get_all_tracks()
+                     if t.get('Location') and not Path(location_to_path(t['Location'])).exists()}
+
+        relinked = {}
+        for file_path in candidate_files:
+            try:
+                hashes, offsets = self.fingerprinter.fingerprint_file(file_path)
+            except Exception as e:
+                print(f"❌ 指紋を計算できませんでした: {file_path} ({e})")
+                continue
+            for track_id, _ in self.index.query(hashes, offsets, min_matches=min_matches):
+                if track_id in stale_ids and track_id not in relinked:
+                    relinked[track_id] = path_to_location(str(Path(file_path).resolve()))
+                    break
+        return relinked
+
+
+# 使用例
+if __name__ == "__main__":
+    from rekordbox_xml_parser import RekordboxXMLParser
+
+    xml_path = "rekordbox_analyzer/rekordbox_xml/collections.xml"
+    index_path = "rekordbox_analyzer/fingerprint_index.npz"
+
+    parser = RekordboxXMLParser(xml_path)
+    index = FingerprintIndex.load(index_path) if Path(index_path).exists() else None
+    indexer = LibraryFingerprintIndexer(parser, index)
+
+    added = indexer.index_library()
+    indexer.index.save(index_path)
+    print(f"✅ {added} 曲の指紋を追加しました（合計 {len(indexer.index.track_ids)} 曲）")
+
+    duplicates = indexer.find_duplicate_tracks()
+    print(f"\n🔁 重複候補: {len(duplicates)} グループ")
+    for cluster in duplicates:
+        print("-" * 40)
+        for track in cluster:
+            print(f"   {track['TrackID']}: {track['Artist']} - {track['Name']}")
+            print(f"      {parser._format_location(track['Location'])}")
@@ -1,14 +1,39 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import librosa
-import librosa.display
 from pathlib import Path
 import urllib.parse
 from typing import Optional, Tuple
 
-# 日本語フォント設定
-plt.rcParams['font.family'] = ['Hiragino Sans', 'Yu Gothic', 'Meiryo', 'Takao', 'IPAexGothic', 'IPAPGothic', 'VL PGothic', 'Noto Sans CJK JP']
-plt.rcParams['axes.unicode_minus'] = False
+PITCH_CLASSES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# librosa / matplotlib は読み込みに時間がかかるため、使用する関数内で読み込む
+_pyplot = None
+
+def location_to_path(location: str) -> str:
+    """rekordboxのLocation（file://localhost/...）をローカルパスに変換"""
+    if location.startswith('file://localhost'):
+        return urllib.parse.unquote(location[16:])
+    return location
+
+def path_to_location(file_path: str) -> str:
+    """ローカルパスをrekordboxのLocation形式に変換"""
+    return 'file://localhost' + urllib.parse.quote(file_path, safe='/')
+
+def configure_japanese_fonts():
+    """matplotlib の日本語フォントを設定する"""
+    import matplotlib
+    
+    matplotlib.rcParams['font.family'] = ['Hiragino Sans', 'Yu Gothic', 'Meiryo', 'Takao', 'IPAexGothic', 'IPAPGothic', 'VL PGothic', 'Noto Sans CJK JP']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+
+def _get_pyplot():
+    """matplotlib.pyplot を初回使用時に読み込む"""
+    global _pyplot
+    if _pyplot is None:
+        import matplotlib.pyplot as plt
+        
+        configure_japanese_fonts()
+        _pyplot = plt
+    return _pyplot
 
 class AudioSpectrumVisualizer:
     def __init__(self):
@@ -17,10 +42,11 @@ class AudioSpectrumVisualizer:
     
     def load_audio(self, file_path: str, sr: Optional[int] = None) -> Tuple[np.ndarray, int]:
         """オーディオファイルを読み込む"""
+        import librosa
+        
         try:
             # URL デコード（rekordboxのLocationから使用する場合）
-            if file_path.startswith('file://localhost'):
-                file_path = urllib.parse.unquote(file_path[16:])
+            file_path = location_to_path(file_path)
             
             # ファイル存在確認
             if not Path(file_path).exists():
@@ -39,6 +65,8 @@ class AudioSpectrumVisualizer:
     
     def create_spectrogram(self, y: np.ndarray, sr: int, n_fft: int = 2048, hop_length: int = 512) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """スペクトログラムを作成"""
+        import librosa
+        
         # 短時間フーリエ変換
         stft = librosa.stft(y, n_fft=n_fft, hop_length=hop_length)
         magnitude = np.abs(stft)
@@ -52,19 +80,32 @@ class AudioSpectrumVisualizer:
         
         return magnitude_db, times, freqs
     
-    def create_mel_spectrogram(self, y: np.ndarray, sr: int, n_mels: int = 128) -> Tuple[np.ndarray, np.ndarray]:
+    def create_mel_spectrogram(self, y: np.ndarray, sr: int, n_mels: int = 128, hop_length: int = 512) -> Tuple[np.ndarray, np.ndarray]:
         """メル・スペクトログラムを作成"""
+        import librosa
+        
         # メル・スペクトログラム
-        mel_spec = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=n_mels)
+        mel_spec = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=n_mels, hop_length=hop_length)
         mel_spec_db = librosa.power_to_db(mel_spec, ref=np.max)
         
         # 時間軸
-        times = librosa.times_like(mel_spec, sr=sr)
+        times = librosa.times_like(mel_spec, sr=sr, hop_length=hop_length)
         
         return mel_spec_db, times
     
+    def create_chromagram(self, y: np.ndarray, sr: int, hop_length: int = 512) -> Tuple[np.ndarray, np.ndarray]:
+        """クロマグラムを作成"""
+        import librosa
+        
+        chroma = librosa.feature.chroma_stft(y=y, sr=sr, hop_length=hop_length)
+        times = librosa.times_like(chroma, sr=sr, hop_length=hop_length)
+        
+        return chroma, times
+    
     def plot_waveform(self, y: np.ndarray, sr: int, title: str = "Waveform"):
         """波形を表示"""
+        plt = _get_pyplot()
+        
         plt.figure(figsize=(14, 4))
         times = np.arange(len(y)) / sr
         plt.plot(times, y, alpha=0.8)
@@ -77,6 +118,9 @@ class AudioSpectrumVisualizer:
     
     def plot_spectrogram(self, magnitude_db: np.ndarray, times: np.ndarray, freqs: np.ndarray, title: str = "Spectrogram"):
         """スペクトログラムを表示"""
+        import librosa.display
+        plt = _get_pyplot()
+        
         plt.figure(figsize=(14, 8))
         librosa.display.specshow(magnitude_db, 
                                 x_axis='time', 
@@ -93,6 +137,9 @@ class AudioSpectrumVisualizer:
     
     def plot_mel_spectrogram(self, mel_spec_db: np.ndarray, times: np.ndarray, sr: int, title: str = "Mel Spectrogram"):
         """メル・スペクトログラムを表示"""
+        import librosa.display
+        plt = _get_pyplot()
+        
         plt.figure(figsize=(14, 8))
         librosa.display.specshow(mel_spec_db, 
                                 x_axis='time', 
@@ -108,8 +155,11 @@ class AudioSpectrumVisualizer:
     
     def plot_chromagram(self, y: np.ndarray, sr: int, title: str = "Chromagram"):
         """クロマグラムを表示"""
+        import librosa.display
+        plt = _get_pyplot()
+        
         plt.figure(figsize=(14, 6))
-        chroma = librosa.feature.chroma_stft(y=y, sr=sr)
+        chroma, _ = self.create_chromagram(y, sr)
         librosa.display.specshow(chroma, 
                                 x_axis='time', 
                                 y_axis='chroma',
@@ -122,8 +172,11 @@ class AudioSpectrumVisualizer:
         plt.tight_layout()
         return plt.gcf()
     
-    def analyze_audio_file(self, file_path: str, show_plots: bool = True, save_plots: bool = False, output_dir: str = "output"):
+    def analyze_audio_file(self, file_path: str, show_plots: bool = True, save_plots: bool = False, output_dir: str = "output", dpi: int = 150):
         """音楽ファイルの総合分析"""
+        plt = _get_pyplot()
+        figures = []
+        
         try:
             # オーディオ読み込み
             y, sr = self.load_audio(file_path)
@@ -134,8 +187,6 @@ class AudioSpectrumVisualizer:
             print(f"\n🎵 音楽分析開始: {filename}")
             print("-" * 50)
             
-            figures = []
-            
             # 1. 波形表示
             print("📊 波形を生成中...")
             fig_wave = self.plot_waveform(y, sr, f"波形 - {filename}")
@@ -166,7 +217,7 @@ class AudioSpectrumVisualizer:
                 print(f"\n💾 画像を保存中... ({output_path})")
                 for name, fig in figures:
                     save_path = output_path / f"{filename}_{name}.png"
-                    fig.savefig(save_path, dpi=150, bbox_inches='tight')
+                    fig.savefig(save_path, dpi=dpi, bbox_inches='tight')
                     print(f"   ✅ {save_path}")
             
             # 表示
@@ -180,6 +231,11 @@ class AudioSpectrumVisualizer:
         except Exception as e:
             print(f"❌ エラーが発生しました: {e}")
             raise
+        
+        finally:
+            # バッチ処理でFigureが溜まらないよう、表示・保存後は必ずpyplotの管理から外す
+            for _, fig in figures:
+                plt.close(fig)
 
 # 使用例とテスト用コード
 if __name__ == "__main__":
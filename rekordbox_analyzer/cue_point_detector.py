@@ -0,0 +1,205 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, List, Optional
+
+from rekordbox_xml_parser import RekordboxXMLParser
+from audio_feature_cache import AudioFeatureCache
+from track_verifier import beat_grid, estimate_tempo
+
+# ホットキューの色（rekordboxのキーカラーに近いRGB）
+CUE_COLORS = {
+    'Intro': (40, 226, 20),
+    'Drop': (230, 40, 40),
+    'Breakdown': (48, 90, 255),
+}
+
+
+class CuePointDetector:
+    def __init__(self, cache: AudioFeatureCache, window_bars: int = 4, phrase_bars: int = 4,
+                 min_contrast_db: float = 3.0, max_hot_cues: int = 8):
+        """オンセット強度・RMS・ビートグリッドからフレーズ境界を検出してキューを提案する
+
+        window_bars: 境界の前後で比較する小節数
+        phrase_bars: 境界候補にする小節の間隔（フレーズ単位、開始位置は曲ごとに推定）
+        min_contrast_db: 境界とみなす前後のRMS差（dB）
+        max_hot_cues: 割り当てるホットキューの最大数（A〜H）
+        """
+        self.cache = cache
+        self.window_bars = window_bars
+        self.phrase_bars = phrase_bars
+        self.min_contrast_db = min_contrast_db
+        self.max_hot_cues = max_hot_cues
+
+    def _downbeat_phase(self, features: Dict[str, np.ndarray], beat_times: np.ndarray,
+                        beats_per_bar: int = 4) -> int:
+        """推定した拍のうち、オンセット強度の平均が最も大きい位相を1拍目とみなす"""
+        onset_env = features['onset_env']
+        frames = np.round(beat_times * int(features['sr']) / int(features['hop_length'])).astype(np.int64)
+        strengths = onset_env[np.clip(frames, 0, len(onset_env) - 1)]
+        n_bars = len(strengths) // beats_per_bar
+        if n_bars == 0:
+            return 0
+        return int(np.argmax(strengths[:n_bars * beats_per_bar].reshape(n_bars, beats_per_bar).mean(axis=0)))
+
+    def _downbeats(self, features: Dict[str, np.ndarray], tempo_list: Optional[List[Dict]]) -> np.ndarray:
+        """小節頭の時刻を求める（TEMPOがなければ推定した拍から1拍目の位置を推定する）"""
+        duration = float(features['duration'])
+        if not tempo_list:
+            bpm, beat_times = estimate_tempo(features)
+            if bpm <= 0:
+                return np.empty(0)
+            phase = self._downbeat_phase(features, beat_times)
+            tempo_list = [{'Inizio': beat_times[phase], 'Bpm': bpm, 'Metro': '4/4', 'Battito': '1'}]
+
+        times, beat_in_bar = beat_grid(tempo_list, duration)
+        return times[(beat_in_bar == 0) & (times < duration)]
+
+    def bar_features(self, features: Dict[str, np.ndarray], downbeats: np.ndarray):
+        """フレーム単位のRMS(dB)とオンセット強度を小節ごとに平均"""
+        sr = int(features['sr'])
+        hop_length = int(features['hop_length'])
+        rms_db = 20 * np.log10(np.maximum(features['rms'], 1e-5))
+        onset_env = features['onset_env']
+        n_frames = min(len(rms_db), len(onset_env))
+
+        frame_times = np.arange(n_frames) * hop_length / sr
+        bar_index = np.searchsorted(downbeats, frame_times, side='right') - 1
+        valid = bar_index >= 0
+        n_bars = len(downbeats)
+
+        counts = np.bincount(bar_index[valid], minlength=n_bars)
+        safe_counts = np.maximum(counts, 1)
+        energy = np.bincount(bar_index[valid], weights=rms_db[:n_frames][valid], minlength=n_bars) / safe_counts
+        onset = np.bincount(bar_index[valid], weights=onset_env[:n_frames][valid], minlength=n_bars) / safe_counts
+        return energy, onset
+
+    def detect_sections(self, features: Dict[str, np.ndarray],
+                        tempo_list: Optional[List[Dict]] = None) -> List[Dict]:
+        """フレーズ境界を検出し、小節頭にスナップした区間の開始点を返す
+
+        戻り値は {'Name': 'Intro'/'Drop'/'Breakdown', 'Start': 秒, 'Bar': 小節番号, 'Strength': 強さ} のリスト。
+        """
+        downbeats = self._downbeats(features, tempo_list)
+        if len(downbeats) == 0:
+            return []
+
+        sections = [{'Name': 'Intro', 'Start': float(downbeats[0]), 'Bar': 0, 'Strength': np.inf}]
+        w = self.window_bars
+        n_bars = len(downbeats)
+        if n_bars < 2 * w + 1:
+            return sections
+
+        energy, onset = self.bar_features(features, downbeats)
+
+        # 累積和で各小節の前後w小節の平均を一括計算
+        bars = np.arange(w, n_bars - w + 1)
+        energy_sum = np.concatenate([[0.0], np.cumsum(energy)])
+        onset_sum = np.concatenate([[0.0], np.cumsum(onset)])
+        energy_contrast = (energy_sum[bars + w] - 2 * energy_sum[bars] + energy_sum[bars - w]) / w
+        onset_contrast = (onset_sum[bars + w] - 2 * onset_sum[bars] + onset_sum[bars - w]) / w
+        onset_scale = onset.std() if onset.std() > 0 else 1.0
+        strength = np.abs(energy_contrast) + 0.5 * np.abs(onset_contrast) / onset_scale * self.min_contrast_db
+
+        # 前後w小節内で最も強い変化を全小節から探す
+        padded = np.pad(strength, w, constant_values=-np.inf)
+        local_max = strength >= sliding_window_view(padded, 2 * w + 1).max(axis=1)
+        significant = local_max & (np.abs(energy_contrast) >= self.min_contrast_db)
+
+        # アウフタクトやフレーズ途中のInizioがあるため、フレーズの開始位置（小節番号の余り）は
+        # 強い変化の合計が最大になるものを選ぶ
+        phase = bars % self.phrase_bars
+        phase_strength = np.bincount(phase[significant], weights=strength[significant],
+                                     minlength=self.phrase_bars)
+        candidates = significant & (phase == int(np.argmax(phase_strength)))
+
+        for i in np.nonzero(candidates)[0]:
+            sections.append({
+                'Name': 'Drop' if energy_contrast[i] > 0 else 'Breakdown',
+                'Start': float(downbeats[bars[i]]),
+                'Bar': int(bars[i]),
+                'Strength': float(strength[i]),
+            })
+        return sections
+
+    def to_position_marks(self, sections: List[Dict]) -> List[Dict]:
+        """検出した区間をPOSITION_MARK形式（ホットキー + メモリーキュー）に変換
+
+        強い順に max_hot_cues 個をホットキューとし、時間順に番号を振る。
+        すべての区間はメモリーキューとしても追加する。
+        """
+        ranked = sorted(sections, key=lambda s: -s['Strength'])[:self.max_hot_cues]
+        hot = sorted(ranked, key=lambda s: s['Start'])
+
+        marks = []
+        for num, section in enumerate(hot):
+            red, green, blue = CUE_COLORS[section['Name']]
+            marks.append({
+                'Name': section['Name'],
+                'Type': '0',
+                'Start': f"{section['Start']:.3f}",
+                'Num': str(num),
+                'Red': str(red),
+                'Green': str(green),
+                'Blue': str(blue),
+            })
+        for section in sections:
+            marks.append({
+                'Name': section['Name'],
+                'Type': '0',
+                'Start': f"{section['Start']:.3f}",
+                'Num': '-1',
+                'Red': None,
+                'Green': None,
+                'Blue': None,
+            })
+        return marks
+
+    def detect_track(self, track_info: Dict, features: Optional[Dict[str, np.ndarray]] = None) -> List[Dict]:
+        """1曲のキュー候補をPOSITION_MARK形式で返す"""
+        if features is None:
+            features = self.cache.get_features(track_info['Location'])
+        sections = self.detect_sections(features, track_info.get('TEMPO'))
+        return self.to_position_marks(sections)
+
+    def detect_library(self, tracks: List[Dict], only_without_cues: bool = True,
+                       cached_only: bool = False) -> Dict[str, List[Dict]]:
+        """ライブラリ全体のキュー候補を TrackID → POSITION_MARKリスト で返す"""
+        results = {}
+        for track in tracks:
+            if not track.get('Location'):
+                continue
+            if only_without_cues and track.get('POSITION_MARK'):
+                continue
+            try:
+                if cached_only:
+                    features = self.cache.get_cached_features(track['Location'])
+                    if features is None:
+                        continue
+                else:
+                    features = self.cache.get_features(track['Location'])
+                results[track['TrackID']] = self.detect_track(track, features)
+            except Exception as e:
+                print(f"❌ キューを検出できませんでした: {track['Name']} ({e})")
+        return results
+
+
+# 使用例
+if __name__ == "__main__":
+    from rekordbox_xml_writer import RekordboxXMLWriter
+
+    xml_path = "rekordbox_analyzer/rekordbox_xml/collections.xml"
+
+    parser = RekordboxXMLParser(xml_path)
+    detector = CuePointDetector(AudioFeatureCache("rekordbox_analyzer/feature_cache"))
+    results = detector.detect_library(parser.get_tracks_by_artist("LiSA"))
+
+    for track_id, marks in results.items():
+        track = parser.get_track_by_id(track_id)
+        track['POSITION_MARK'] = marks
+        parser.display_track_info(track)
+
+    # 提案したキューをrekordboxに読み込めるXMLとして書き出す
+    writer = RekordboxXMLWriter(xml_path)
+    for track_id, marks in results.items():
+        writer.add_position_marks(track_id, marks)
+    writer.write("rekordbox_analyzer/rekordbox_xml/collections_cues.xml")
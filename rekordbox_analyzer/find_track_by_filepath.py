@@ -3,14 +3,40 @@ import sys
 import urllib.parse
 from rekordbox_xml_parser import RekordboxXMLParser
 
+def normalize_filepath(filepath: str) -> str:
+    """ファイルパスまたはLocationを比較用のLocation形式（URLエンコード済み）に正規化"""
+    # file://localhost プレフィックスを統一
+    if not filepath.startswith('file://localhost'):
+        if filepath.startswith('/'):
+            filepath = 'file://localhost' + filepath
+        else:
+            filepath = 'file://localhost/' + filepath
+    
+    # URL エンコード
+    # file://localhost 部分は除いてエンコード
+    prefix = 'file://localhost'
+    path_part = filepath[len(prefix):]
+    
+    # パス部分をエンコード（ただし既にエンコードされている場合は再エンコードしない）
+    try:
+        # デコードしてから再エンコードしてみる
+        decoded = urllib.parse.unquote(path_part)
+        encoded = urllib.parse.quote(decoded, safe='/')
+    except:
+        # エンコード/デコードに失敗した場合はそのまま使用
+        encoded = path_part
+    
+    return prefix + encoded
+
 class TrackByFilePathFinder:
-    def __init__(self, xml_file_path: str):
-        self.parser = RekordboxXMLParser(xml_file_path)
+    def __init__(self, xml_file_path: str, parser: RekordboxXMLParser = None):
+        # 読み込み済みのパーサーがあれば使い回す
+        self.parser = parser or RekordboxXMLParser(xml_file_path)
     
     def find_track_by_filepath(self, target_filepath: str) -> dict:
         """指定されたファイルパスに対応するトラック情報を検索"""
         # ファイルパスを正規化（URL エンコードされた形式に変換）
-        normalized_target = self._normalize_filepath(target_filepath)
+        normalized_target = normalize_filepath(target_filepath)
         
         # すべてのトラックを取得
         all_tracks = self.parser.get_all_tracks()
@@ -19,7 +45,7 @@ class TrackByFilePathFinder:
         for track in all_tracks:
             if track.get('Location'):
                 track_location = track['Location']
-                normalized_location = self._normalize_filepath(track_location)
+                normalized_location = normalize_filepath(track_location)
                 
                 # 完全一致チェック
                 if normalized_target == normalized_location:
@@ -39,30 +65,14 @@ class TrackByFilePathFinder:
         
         return None
     
-    def _normalize_filepath(self, filepath: str) -> str:
-        """ファイルパスを正規化"""
-        # file://localhost プレフィックスを統一
-        if not filepath.startswith('file://localhost'):
-            if filepath.startswith('/'):
-                filepath = 'file://localhost' + filepath
-            else:
-                filepath = 'file://localhost/' + filepath
-        
-        # URL エンコード
-        # file://localhost 部分は除いてエンコード
-        prefix = 'file://localhost'
-        path_part = filepath[len(prefix):]
-        
-        # パス部分をエンコード（ただし既にエンコードされている場合は再エンコードしない）
-        try:
-            # デコードしてから再エンコードしてみる
-            decoded = urllib.parse.unquote(path_part)
-            encoded = urllib.parse.quote(decoded, safe='/')
-        except:
-            # エンコード/デコードに失敗した場合はそのまま使用
-            encoded = path_part
+    def find_track_by_audio(self, target_filepath: str, indexer) -> dict:
+        """パスで見つからない場合は音響指紋で検索（移動・再エンコードされたファイル用）"""
+        track = self.find_track_by_filepath(target_filepath)
+        if track:
+            return track
         
-        return prefix + encoded
+        # indexer は audio_fingerprint.LibraryFingerprintIndexer
+        return indexer.find_track_by_audio(target_filepath)
 
 def main():
     target_filepath = "file://localhost/Volumes/NO%20NAME/iTunes/iTunes%20Media/Music/LiSA/LOVER_S_MiLE/02%20oath%20sign.m4a"
@@ -1,12 +1,24 @@
 import xml.etree.ElementTree as ET
-from typing import Dict, List, Optional
+from typing import Dict, FrozenSet, List, Optional, Tuple
 import html
 
+def playlist_path_segment(name: str) -> str:
+    """プレイリスト名をパスの1要素に変換（名前中の "/" は "\\/" にエスケープ）
+
+    "House/Techno" という名前のプレイリストと、フォルダ House 内の Techno を区別するため。
+    """
+    return name.replace('\\', '\\\\').replace('/', '\\/')
+
 class RekordboxXMLParser:
     def __init__(self, xml_file_path: str):
         self.xml_file_path = xml_file_path
         self.tree = None
         self.root = None
+        self._track_elements = {}   # TrackID → TRACKエレメント
+        self.playlists = {}         # プレイリストのパス → TrackIDのタプル（登録順）
+        self.playlist_track_sets = {}  # プレイリストのパス → TrackIDの集合
+        self.playlist_folders = {}  # フォルダのパス → 配下すべてのTrackIDの集合
+        self.track_playlists = {}   # TrackID → 含まれるプレイリストのパスのリスト
         self._load_xml()
     
     def _load_xml(self):
@@ -16,17 +28,115 @@ class RekordboxXMLParser:
             self.root = self.tree.getroot()
         except Exception as e:
             raise Exception(f"XMLファイルの読み込みに失敗しました: {e}")
+        
+        collection = self.root.find('COLLECTION')
+        if collection is not None:
+            self._track_elements = {track.get('TrackID'): track for track in collection.iter('TRACK')}
+        
+        playlists = self.root.find('PLAYLISTS')
+        if playlists is not None:
+            self._index_playlists(playlists)
+    
+    def _index_playlists(self, playlists_element):
+        """PLAYLISTSツリーからプレイリスト・フォルダ・逆引きの索引を作成"""
+        location_to_id = None
+        
+        def resolve_keys(node) -> Tuple[str, ...]:
+            """プレイリストのTRACK KeyをTrackIDに変換（KeyType=1 はLocation指定）"""
+            nonlocal location_to_id
+            keys = [track.get('Key') for track in node.findall('TRACK')]
+            if node.get('KeyType') != '1':
+                return tuple(keys)
+            
+            if location_to_id is None:
+                location_to_id = {element.get('Location'): track_id
+                                  for track_id, element in self._track_elements.items()}
+            return tuple(location_to_id[key] for key in keys if key in location_to_id)
+        
+        def walk(node, path: str) -> FrozenSet[str]:
+            """ノードを再帰的にたどり、配下のTrackID集合を返す"""
+            if node.get('Type') == '1':
+                track_ids = resolve_keys(node)
+                track_set = frozenset(track_ids)
+                self.playlists[path] = track_ids
+                self.playlist_track_sets[path] = track_set
+                for track_id in dict.fromkeys(track_ids):
+                    self.track_playlists.setdefault(track_id, []).append(path)
+                return track_set
+            
+            members = set()
+            used_segments = set()
+            for child in node.findall('NODE'):
+                segment = playlist_path_segment(child.get('Name', ''))
+                # 同じフォルダ内の同名ノードはパスが重なるため番号を付けて区別する
+                if segment in used_segments:
+                    number = 2
+                    while f"{segment} ({number})" in used_segments:
+                        number += 1
+                    renamed = f"{segment} ({number})"
+                    print(f"⚠️  同名のプレイリストがあるため名前を変更しました: "
+                          f"{path + '/' if path else ''}{segment} → {renamed}")
+                    segment = renamed
+                used_segments.add(segment)
+                child_path = f"{path}/{segment}" if path else segment
+                members |= walk(child, child_path)
+            members = frozenset(members)
+            self.playlist_folders[path] = members
+            return members
+        
+        root_node = playlists_element.find('NODE')
+        if root_node is not None:
+            walk(root_node, '')
     
     def get_track_by_id(self, track_id: str) -> Optional[Dict]:
         """TrackIDで特定のトラックを取得"""
-        collection = self.root.find('COLLECTION')
-        if collection is None:
+        track = self._track_elements.get(track_id)
+        if track is None:
             return None
-        
-        for track in collection.findall('TRACK'):
-            if track.get('TrackID') == track_id:
-                return self._parse_track(track)
-        return None
+        return self._parse_track(track)
+    
+    def get_playlist_names(self) -> List[str]:
+        """すべてのプレイリストのパス（"フォルダ/プレイリスト"）を取得
+
+        名前中の "/" は "\\/" に、同じフォルダ内の同名プレイリストは "名前 (2)" のように変換される。
+        """
+        return list(self.playlists)
+    
+    def get_playlist_track_ids(self, path: str) -> Tuple[str, ...]:
+        """プレイリストのTrackIDを登録順で取得（フォルダの場合は配下すべて）"""
+        if path in self.playlists:
+            return self.playlists[path]
+        if path in self.playlist_folders:
+            return tuple(sorted(self.playlist_folders[path]))
+        raise KeyError(f"プレイリストが見つかりません: {path}")
+    
+    def get_playlist_tracks(self, path: str) -> List[Dict]:
+        """プレイリスト（またはフォルダ配下）のトラック情報を取得"""
+        tracks = []
+        for track_id in self.get_playlist_track_ids(path):
+            track = self.get_track_by_id(track_id)
+            if track:
+                tracks.append(track)
+        return tracks
+    
+    def get_playlists_for_track(self, track_id: str) -> List[str]:
+        """指定したトラックを含むプレイリストのパスを取得"""
+        return list(self.track_playlists.get(track_id, []))
+    
+    def get_playlist_track_set(self, path: str) -> FrozenSet[str]:
+        """プレイリストまたはフォルダに含まれるTrackIDの集合を取得"""
+        if path in self.playlist_track_sets:
+            return self.playlist_track_sets[path]
+        if path in self.playlist_folders:
+            return self.playlist_folders[path]
+        raise KeyError(f"プレイリストが見つかりません: {path}")
+    
+    def get_common_track_ids(self, *paths: str) -> FrozenSet[str]:
+        """複数のプレイリスト・フォルダに共通するTrackIDの集合を取得"""
+        if not paths:
+            return frozenset()
+        sets = sorted((self.get_playlist_track_set(path) for path in paths), key=len)
+        return sets[0].intersection(*sets[1:])
     
     def get_tracks_by_name(self, name: str) -> List[Dict]:
         """名前でトラックを検索"""
@@ -0,0 +1,230 @@
+import re
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, List
+
+# TRACK開始タグ（属性値内の ">" を考慮）
+TRACK_START_TAG = re.compile(rb'<TRACK(?=[\s/>])(?:[^>"\']|"[^"]*"|\'[^\']*\')*>')
+TRACK_ID_ATTR = re.compile(rb'\sTrackID="([^"]*)"')
+
+# 数値を渡された場合の書式（rekordboxの書き出し形式に合わせる）
+FLOAT_FORMATS = {
+    'Inizio': '{:.3f}',
+    'Start': '{:.3f}',
+    'End': '{:.3f}',
+    'Bpm': '{:.2f}',
+    'AverageBpm': '{:.2f}',
+}
+
+
+def _format_value(name: str, value) -> str:
+    """属性値を文字列に変換"""
+    if isinstance(value, float):
+        return FLOAT_FORMATS.get(name, '{}').format(value)
+    return str(value)
+
+
+class RekordboxXMLWriter:
+    def __init__(self, xml_file_path: str, chunk_size: int = 1024 * 1024):
+        """rekordbox XMLのTRACKをTrackID単位で書き換えて別ファイルに出力する
+
+        変更対象のTRACKエレメントだけを解析・再生成し、それ以外はバイト単位でそのまま
+        コピーする。メモリ使用量はチャンクサイズとエレメントの大きさで決まる。
+        """
+        self.xml_file_path = xml_file_path
+        self.chunk_size = chunk_size
+        self.edits: Dict[str, Dict] = {}
+
+    def _edit(self, track_id: str) -> Dict:
+        return self.edits.setdefault(str(track_id), {})
+
+    def set_attributes(self, track_id: str, attributes: Dict):
+        """TRACKの属性を変更（Noneの属性は削除）"""
+        self._edit(track_id).setdefault('attributes', {}).update(attributes)
+
+    def set_beat_grid(self, track_id: str, tempo_list: List[Dict]):
+        """TEMPO（ビートグリッド）を置き換える"""
+        self._edit(track_id)['TEMPO'] = list(tempo_list)
+
+    def set_position_marks(self, track_id: str, marks: List[Dict]):
+        """POSITION_MARK（キュー）をすべて置き換える"""
+        edit = self._edit(track_id)
+        edit['POSITION_MARK'] = list(marks)
+        edit.pop('add_POSITION_MARK', None)
+
+    def add_position_marks(self, track_id: str, marks: List[Dict]):
+        """POSITION_MARK（キュー）を追加"""
+        self._edit(track_id).setdefault('add_POSITION_MARK', []).extend(marks)
+
+    def _make_child(self, tag: str, values: Dict) -> ET.Element:
+        """辞書からTEMPO / POSITION_MARKエレメントを作成（Noneの値は省略）"""
+        return ET.Element(tag, {name: _format_value(name, value)
+                                for name, value in values.items() if value is not None})
+
+    def _apply_edit(self, element_bytes: bytes, indent: bytes, edit: Dict) -> bytes:
+        """TRACKエレメントに変更を適用して再生成"""
+        track = ET.fromstring(element_bytes)
+
+        for name, value in edit.get('attributes', {}).items():
+            if value is None:
+                track.attrib.pop(name, None)
+            else:
+                track.set(name, _format_value(name, value))
+
+        children_changed = False
+        for tag in ('TEMPO', 'POSITION_MARK'):
+            if tag in edit:
+                for child in track.findall(tag):
+                    track.remove(child)
+                for values in edit[tag]:
+                    track.append(self._make_child(tag, values))
+                children_changed = True
+        for values in edit.get('add_POSITION_MARK', []):
+            track.append(self._make_child('POSITION_MARK', values))
+            children_changed = True
+
+        if children_changed:
+            # rekordboxと同じく子要素を1段深くインデントする
+            track_indent = indent.decode('utf-8')
+            child_indent = track_indent + '  '
+            children = list(track)
+            track.text = '\n' + child_indent if children else None
+            for i, child in enumerate(children):
+                child.tail = '\n' + (child_indent if i < len(children) - 1 else track_indent)
+
+        # ElementTreeの空要素 "<TAG ... />" をrekordboxの "<TAG .../>" に揃える
+        return ET.tostring(track, encoding='utf-8').replace(b'" />', b'"/>')
+
+    def write(self, output_file_path: str) -> List[str]:
+        """変更を適用したXMLを出力し、更新したTrackIDのリストを返す"""
+        if Path(output_file_path).resolve() == Path(self.xml_file_path).resolve():
+            raise ValueError("入力ファイルと同じパスには出力できません")
+
+        updated = []
+        with open(self.xml_file_path, 'rb') as src, open(output_file_path, 'wb') as dst:
+            self._stream(src, dst, updated)
+
+        missing = set(self.edits) - set(updated)
+        if missing:
+            print(f"⚠️  コレクションに存在しないTrackID: {', '.join(sorted(missing))}")
+        return updated
+
+    def _stream(self, src, dst, updated: List[str]):
+        """COLLECTION内のTRACKを順に読み、変更対象だけ書き換えてコピー
+
+        buf は読み込み済みのデータ、pos はまだ出力していない位置。
+        TRACKごとに buf を切り詰めると処理量がチャンクサイズ×曲数になるため、
+        位置だけ進めて、詰め直しは次のチャンクを読むときに1回だけ行う。
+        """
+        buf = bytearray()
+        pos = 0
+
+        def fill() -> bool:
+            nonlocal pos
+            chunk = src.read(self.chunk_size)
+            if not chunk:
+                return False
+            del buf[:pos]
+            pos = 0
+            buf.extend(chunk)
+            return True
+
+        def copy_until(marker: bytes) -> bool:
+            """markerの直前までをコピー（見つからなければすべてコピーしてFalse）"""
+            nonlocal pos
+            keep = len(marker) - 1
+            while True:
+                index = buf.find(marker, pos)
+                if index != -1:
+                    dst.write(buf[pos:index])
+                    pos = index
+                    return True
+                flush_to = max(pos, len(buf) - keep)
+                dst.write(buf[pos:flush_to])
+                pos = flush_to
+                if not fill():
+                    dst.write(buf[pos:])
+                    pos = len(buf)
+                    return False
+
+        if not copy_until(b'<COLLECTION'):
+            return
+
+        collection_end = b'</COLLECTION>'
+        keep = len(collection_end) - 1
+        while True:
+            track_index = buf.find(b'<TRACK', pos)
+            if track_index == -1:
+                if buf.find(collection_end, pos) != -1:
+                    break
+                flush_to = max(pos, len(buf) - keep)
+                dst.write(buf[pos:flush_to])
+                pos = flush_to
+                if not fill():
+                    break
+                continue
+            if buf.find(collection_end, pos, track_index) != -1:
+                break
+
+            # TRACK直前の行頭からのインデントを取得してからコピー
+            line_start = buf.rfind(b'\n', 0, track_index) + 1
+            indent = bytes(buf[line_start:track_index])
+            if indent.strip():
+                indent = b''
+            dst.write(buf[pos:track_index])
+            pos = track_index
+
+            start_tag = TRACK_START_TAG.match(buf, pos)
+            while start_tag is None and fill():
+                start_tag = TRACK_START_TAG.match(buf, pos)
+            if start_tag is None:
+                break
+            tag = start_tag.group()
+
+            # fill() で位置がずれるため、タグ末尾はposからの相対位置で持つ
+            tag_length = len(tag)
+            if tag.endswith(b'/>'):
+                element_length = tag_length
+            else:
+                close_index = buf.find(b'</TRACK>', pos + tag_length)
+                while close_index == -1:
+                    searched = max(tag_length, len(buf) - pos - len(b'</TRACK>') + 1)
+                    if not fill():
+                        break
+                    close_index = buf.find(b'</TRACK>', pos + searched)
+                if close_index == -1:
+                    break
+                element_length = close_index + len(b'</TRACK>') - pos
+
+            element_end = pos + element_length
+            track_id = TRACK_ID_ATTR.search(tag)
+            edit = self.edits.get(track_id.group(1).decode('utf-8')) if track_id else None
+            if edit is None:
+                dst.write(buf[pos:element_end])
+            else:
+                dst.write(self._apply_edit(bytes(buf[pos:element_end]), indent, edit))
+                updated.append(track_id.group(1).decode('utf-8'))
+            pos = element_end
+
+        # COLLECTION以降（PLAYLISTSなど）はそのままコピー
+        dst.write(buf[pos:])
+        while True:
+            chunk = src.read(self.chunk_size)
+            if not chunk:
+                break
+            dst.write(chunk)
+
+
+# 使用例
+if __name__ == "__main__":
+    xml_path = "rekordbox_analyzer/rekordbox_xml/collections.xml"
+
+    writer = RekordboxXMLWriter(xml_path)
+    writer.set_beat_grid("109686241", [
+        {'Inizio': 0.025, 'Bpm': 128.0, 'Metro': '4/4', 'Battito': 1},
+    ])
+    writer.add_position_marks("109686241", [
+        {'Name': '', 'Type': 0, 'Start': 30.025, 'Num': 0, 'Red': 40, 'Green': 226, 'Blue': 20},
+    ])
+    updated = writer.write("rekordbox_analyzer/rekordbox_xml/collections_updated.xml")
+    print(f"✅ {len(updated)} 曲を更新しました")
@@ -0,0 +1,204 @@
+import numpy as np
+import hashlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from audio_spectrum_visualizer import AudioSpectrumVisualizer, PITCH_CLASSES, configure_japanese_fonts, location_to_path
+
+
+def thumbnail_name(file_path: str) -> str:
+    """出力ファイル名の接頭辞（デコードしたファイル名 + パスの短いハッシュ）
+
+    別アルバムの同名ファイル（"01 Intro" など）が同じフォルダで上書きし合わないようにする。
+    """
+    path = location_to_path(file_path)
+    digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:8]
+    return f"{Path(path).stem}_{digest}"
+
+
+def minmax_envelope(y: np.ndarray, n_bins: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """波形をn_bins区間の最小値/最大値エンベロープに間引く
+
+    戻り値は (各区間の開始サンプル位置, 最小値, 最大値)。
+    サンプル数が区間数の2倍以下ならそのまま返す。
+    """
+    n = len(y)
+    if n <= 2 * n_bins:
+        positions = np.arange(n)
+        return positions, y, y
+
+    starts = np.linspace(0, n, n_bins + 1).astype(np.int64)[:-1]
+    mins = np.minimum.reduceat(y, starts)
+    maxs = np.maximum.reduceat(y, starts)
+    return starts, mins, maxs
+
+
+def downsample_matrix(matrix: np.ndarray, n_rows: int, n_cols: int) -> np.ndarray:
+    """2次元の特徴量行列を出力解像度まで最大値プーリングで縮小する"""
+    rows, cols = matrix.shape
+    if rows > n_rows:
+        row_starts = np.linspace(0, rows, n_rows + 1).astype(np.int64)[:-1]
+        matrix = np.maximum.reduceat(matrix, row_starts, axis=0)
+    if cols > n_cols:
+        col_starts = np.linspace(0, cols, n_cols + 1).astype(np.int64)[:-1]
+        matrix = np.maximum.reduceat(matrix, col_starts, axis=1)
+    return matrix
+
+
+class SpectrumThumbnailRenderer:
+    def __init__(self, width_px: int = 1400, height_px: int = 400, dpi: int = 100):
+        """PNG一括出力用の高速レンダラー（Aggバックエンド・Figure再利用）"""
+        self.width_px = width_px
+        self.height_px = height_px
+        self.dpi = dpi
+        self.visualizer = AudioSpectrumVisualizer()
+        configure_japanese_fonts()
+
+        # pyplotを経由せず1枚のFigureを使い回すことでメモリ使用量を一定に保つ
+        self.figure = Figure(figsize=(width_px / dpi, height_px / dpi), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+
+    def _new_axes(self):
+        """Figureをクリアして新しい軸を返す"""
+        self.figure.clear()
+        return self.figure.add_subplot(1, 1, 1)
+
+    def _save(self, save_path: Path):
+        """現在のFigureをPNGとして書き出す"""
+        self.figure.savefig(save_path, dpi=self.dpi, format='png')
+
+    def render_waveform(self, y: np.ndarray, sr: int, save_path: Path, title: str = "Waveform"):
+        """波形をピクセル幅に合わせたエンベロープで描画"""
+        ax = self._new_axes()
+        starts, mins, maxs = minmax_envelope(y, self.width_px)
+        times = starts / sr
+        ax.fill_between(times, mins, maxs, linewidth=0, alpha=0.8)
+        ax.set_xlim(0, len(y) / sr)
+        ax.set_xlabel('時間 (秒)')
+        ax.set_ylabel('振幅')
+        ax.set_title(title)
+        ax.grid(True, alpha=0.3)
+        self.figure.tight_layout()
+        self._save(save_path)
+
+    def _render_matrix(self, matrix: np.ndarray, extent: List[float], title: str, ylabel: str, cmap: str, colorbar_format: Optional[str] = None):
+        """行列を出力解像度に縮小して軸に描画"""
+        ax = self._new_axes()
+        image = downsample_matrix(matrix, self.height_px, self.width_px)
+        im = ax.imshow(image, origin='lower', aspect='auto', extent=extent,
+                       cmap=cmap, interpolation='nearest')
+        self.figure.colorbar(im, ax=ax, format=colorbar_format)
+        ax.set_xlabel('時間 (秒)')
+        ax.set_ylabel(ylabel)
+        ax.set_title(title)
+        return ax
+
+    def render_spectrogram(self, magnitude_db: np.ndarray, freqs: np.ndarray, duration: float,
+                           save_path: Path, title: str = "Spectrogram"):
+        """スペクトログラムを出力解像度に縮小して描画"""
+        self._render_matrix(magnitude_db, [0, duration, freqs[0], freqs[-1]], title,
+                            '周波数 (Hz)', 'magma', '%+2.0f dB')
+        self.figure.tight_layout()
+        self._save(save_path)
+
+    def render_mel_spectrogram(self, mel_spec_db: np.ndarray, duration: float,
+                               save_path: Path, title: str = "Mel Spectrogram"):
+        """メル・スペクトログラムを出力解像度に縮小して描画"""
+        n_mels = mel_spec_db.shape[0]
+        self._render_matrix(mel_spec_db, [0, duration, 0, n_mels], title,
+                            'メル帯域', 'magma', '%+2.0f dB')
+        self.figure.tight_layout()
+        self._save(save_path)
+
+    def render_chromagram(self, chroma: np.ndarray, duration: float,
+                          save_path: Path, title: str = "Chromagram"):
+        """クロマグラムを出力解像度に縮小して描画"""
+        ax = self._render_matrix(chroma, [0, duration, 0, 12], title, '音名', 'coolwarm')
+        ax.set_yticks(np.arange(12) + 0.5)
+        ax.set_yticklabels(PITCH_CLASSES)
+        self.figure.tight_layout()
+        self._save(save_path)
+
+    def compute_spectra(self, y: np.ndarray, sr: int, n_fft: int = 2048, hop_length: int = 512,
+                        n_mels: int = 128) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """STFTを1回だけ計算し、スペクトログラム・メル・クロマをそこから作る
+
+        戻り値は (スペクトログラム(dB), 周波数軸, メル・スペクトログラム(dB), クロマグラム)。
+        """
+        import librosa
+
+        magnitude = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length))
+        magnitude_db = librosa.amplitude_to_db(magnitude, ref=np.max)
+        freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+
+        power = magnitude ** 2
+        del magnitude
+        mel_spec = librosa.feature.melspectrogram(S=power, sr=sr, n_mels=n_mels)
+        mel_spec_db = librosa.power_to_db(mel_spec, ref=np.max)
+        chroma = librosa.feature.chroma_stft(S=power, sr=sr)
+        return magnitude_db, freqs, mel_spec_db, chroma
+
+    def render_audio_file(self, file_path: str, output_dir: str = "thumbnails") -> Dict[str, Path]:
+        """1曲分のサムネイルPNGを生成"""
+        y, sr = self.visualizer.load_audio(file_path)
+        filename = thumbnail_name(file_path)
+        title = Path(location_to_path(file_path)).stem
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
+        duration = len(y) / sr
+
+        saved = {}
+
+        save_path = output_path / f"{filename}_waveform.png"
+        self.render_waveform(y, sr, save_path, f"波形 - {title}")
+        saved['waveform'] = save_path
+
+        magnitude_db, freqs, mel_spec_db, chroma = self.compute_spectra(y, sr)
+
+        save_path = output_path / f"{filename}_spectrogram.png"
+        self.render_spectrogram(magnitude_db, freqs, duration, save_path, f"スペクトログラム - {title}")
+        saved['spectrogram'] = save_path
+        del magnitude_db
+
+        save_path = output_path / f"{filename}_mel_spectrogram.png"
+        self.render_mel_spectrogram(mel_spec_db, duration, save_path, f"メル・スペクトログラム - {title}")
+        saved['mel_spectrogram'] = save_path
+
+        save_path = output_path / f"{filename}_chromagram.png"
+        self.render_chromagram(chroma, duration, save_path, f"クロマグラム - {title}")
+        saved['chromagram'] = save_path
+
+        return saved
+
+    def render_batch(self, file_paths: Iterable[str], output_dir: str = "thumbnails") -> Dict[str, Dict]:
+        """複数ファイルのサムネイルを一括生成（失敗したファイルはスキップ）"""
+        results = {}
+        for file_path in file_paths:
+            try:
+                results[file_path] = self.render_audio_file(file_path, output_dir)
+            except Exception as e:
+                print(f"❌ サムネイル生成に失敗しました: {file_path} ({e})")
+                results[file_path] = {}
+        return results
+
+    def close(self):
+        """使い回しているFigureを解放"""
+        self.figure.clear()
+
+
+# 使用例
+if __name__ == "__main__":
+    from rekordbox_xml_parser import RekordboxXMLParser
+
+    xml_path = "rekordbox_analyzer/rekordbox_xml/collections.xml"
+    parser = RekordboxXMLParser(xml_path)
+
+    renderer = SpectrumThumbnailRenderer(width_px=800, height_px=240)
+    locations = [t['Location'] for t in parser.get_tracks_by_artist("LiSA") if t.get('Location')]
+    results = renderer.render_batch(locations, output_dir="thumbnail_output")
+    renderer.close()
+
+    succeeded = sum(1 for saved in results.values() if saved)
+    print(f"\n✅ {succeeded}/{len(results)} 曲のサムネイルを生成しました")
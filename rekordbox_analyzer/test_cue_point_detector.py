@@ -0,0 +1,54 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from cue_point_detector import CuePointDetector
+
+SR = 22050
+HOP_LENGTH = 512
+BPM = 120.0
+BAR_SECONDS = 4 * 60.0 / BPM
+
+
+def make_features(levels_by_bar, n_bars):
+    """小節ごとのRMSレベルを指定した合成特徴量を作る"""
+    n_frames = int(n_bars * BAR_SECONDS * SR / HOP_LENGTH)
+    frame_bars = (np.arange(n_frames) * HOP_LENGTH / SR // BAR_SECONDS).astype(np.int64)
+    rms = np.asarray(levels_by_bar, dtype=np.float32)[frame_bars]
+    return {
+        'sr': np.int64(SR),
+        'hop_length': np.int64(HOP_LENGTH),
+        'duration': np.float64(n_frames * HOP_LENGTH / SR),
+        'onset_env': (rms * 10).astype(np.float32),
+        'rms': rms,
+    }
+
+
+def test_detects_phrases_offset_from_grid():
+    # ドロップ・ブレイク・2回目のドロップが16/48/64小節目ではなく17/49/65小節目にある曲
+    n_bars = 96
+    levels = np.full(n_bars, 0.05)
+    levels[17:49] = 0.5
+    levels[65:] = 0.5
+    features = make_features(levels, n_bars)
+    tempo_list = [{'Inizio': '0.000', 'Bpm': f"{BPM:.2f}", 'Metro': '4/4', 'Battito': '1'}]
+
+    sections = CuePointDetector(cache=None).detect_sections(features, tempo_list)
+
+    found = {(s['Name'], s['Bar']) for s in sections}
+    assert found == {('Intro', 0), ('Drop', 17), ('Breakdown', 49), ('Drop', 65)}
+    drop = next(s for s in sections if s['Bar'] == 17)
+    assert drop['Start'] == pytest.approx(17 * BAR_SECONDS)
+
+
+def test_downbeat_phase_follows_strongest_beat():
+    # 推定した拍の先頭が小節の3拍目から始まっている場合
+    beat_seconds = 60.0 / BPM
+    beat_times = np.arange(64) * beat_seconds
+    n_frames = int(64 * beat_seconds * SR / HOP_LENGTH) + 1
+    onset_env = np.full(n_frames, 0.1, dtype=np.float32)
+    downbeat_frames = np.round(beat_times[2::4] * SR / HOP_LENGTH).astype(np.int64)
+    onset_env[downbeat_frames] = 1.0
+    features = {'sr': np.int64(SR), 'hop_length': np.int64(HOP_LENGTH), 'onset_env': onset_env}
+
+    assert CuePointDetector(cache=None)._downbeat_phase(features, beat_times) == 2
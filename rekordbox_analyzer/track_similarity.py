@@ -0,0 +1,211 @@
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from rekordbox_xml_parser import RekordboxXMLParser
+from audio_feature_cache import AudioFeatureCache
+from track_verifier import tonality_to_key
+
+MEL_GROUPS = 32
+EMBEDDING_DIM = MEL_GROUPS * 2 + 12 * 2 + 2
+
+
+def compute_embedding(features: Dict[str, np.ndarray]) -> np.ndarray:
+    """キャッシュ済み特徴量から曲単位の埋め込みベクトル（L2正規化済み float32）を作成
+
+    メル帯域を MEL_GROUPS 本にまとめた平均・標準偏差、クロマの平均・標準偏差、
+    オンセット強度とRMSの平均を連結する。
+    """
+    mel = features['mel_spec_db']
+    mel = mel[:mel.shape[0] // MEL_GROUPS * MEL_GROUPS]
+    mel = mel.reshape(MEL_GROUPS, -1, mel.shape[1]).mean(axis=1)
+    chroma = features['chroma']
+
+    blocks = [
+        (mel.mean(axis=1) + 40.0) / 40.0,
+        mel.std(axis=1) / 20.0,
+        chroma.mean(axis=1),
+        chroma.std(axis=1),
+        np.array([features['onset_env'].mean() / 5.0, features['rms'].mean() * 5.0]),
+    ]
+    embedding = np.concatenate(blocks).astype(np.float32)
+    norm = np.linalg.norm(embedding)
+    return embedding / norm if norm > 0 else embedding
+
+
+def camelot_codes(pitch_classes: np.ndarray, minors: np.ndarray) -> np.ndarray:
+    """(ピッチクラス, 短調か) をCamelot番号 1〜12 に変換"""
+    major_pc = np.where(minors, (pitch_classes + 3) % 12, pitch_classes)
+    return ((major_pc - 11) * 7) % 12 + 1
+
+
+class TrackEmbeddingIndex:
+    # この曲数を超えたら近似インデックス（IVF）で検索する
+    BRUTE_FORCE_LIMIT = 20000
+
+    def __init__(self, track_ids: List[str], embeddings: np.ndarray,
+                 bpms: np.ndarray, key_pitch: np.ndarray, key_minor: np.ndarray):
+        """TrackIDと埋め込み行列（連続したfloat32）に対するk近傍検索インデックス
+
+        key_pitch が -1 の曲はキー不明として扱う。
+        """
+        self.track_ids = list(track_ids)
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.bpms = np.asarray(bpms, dtype=np.float32)
+        self.key_pitch = np.asarray(key_pitch, dtype=np.int8)
+        self.key_minor = np.asarray(key_minor, dtype=bool)
+        self.camelot = np.where(self.key_pitch >= 0,
+                                camelot_codes(self.key_pitch.astype(np.int64), self.key_minor), 0)
+        self.position_of = {track_id: i for i, track_id in enumerate(self.track_ids)}
+
+        self.centroids = None
+        self.list_assignments = None
+        if len(self.track_ids) > self.BRUTE_FORCE_LIMIT:
+            self.build_ivf()
+
+    def build_ivf(self, n_lists: Optional[int] = None, n_iter: int = 10, seed: int = 0):
+        """球面k-meansで粗い量子化器を作成（近似検索用）"""
+        n = len(self.track_ids)
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(n)))
+
+        rng = np.random.default_rng(seed)
+        centroids = self.embeddings[rng.choice(n, size=n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assignments = np.argmax(self.embeddings @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, self.embeddings)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            nonempty = norms[:, 0] > 0
+            centroids[nonempty] = sums[nonempty] / norms[nonempty]
+
+        self.centroids = centroids
+        self.list_assignments = np.argmax(self.embeddings @ centroids.T, axis=1)
+
+    def filter_mask(self, bpm: Optional[float] = None, bpm_tolerance: float = 0.06,
+                    key: Optional[Tuple[int, bool]] = None) -> np.ndarray:
+        """BPM範囲・キー互換性による事前フィルタのマスクを作成
+
+        BPMは倍・半分テンポも許容する。キーはCamelotで同じ番号か、同じ調性で隣接する番号を互換とする。
+        """
+        mask = np.ones(len(self.track_ids), dtype=bool)
+
+        if bpm:
+            bpm_mask = np.zeros_like(mask)
+            for factor in (1.0, 2.0, 0.5):
+                bpm_mask |= np.abs(self.bpms * factor - bpm) <= bpm * bpm_tolerance
+            mask &= bpm_mask
+
+        if key is not None:
+            pitch_class, is_minor = key
+            code = int(camelot_codes(np.array([pitch_class]), np.array([is_minor]))[0])
+            distance = np.abs(self.camelot - code)
+            distance = np.minimum(distance, 12 - distance)
+            same_mode = self.key_minor == is_minor
+            mask &= (self.camelot > 0) & ((distance == 0) | (same_mode & (distance == 1)))
+
+        return mask
+
+    def search(self, query: np.ndarray, k: int = 10, mask: Optional[np.ndarray] = None,
+               n_probe: int = 8) -> List[Tuple[str, float]]:
+        """埋め込みベクトルに近い曲を (TrackID, コサイン類似度) の降順で返す"""
+        query = np.asarray(query, dtype=np.float32)
+
+        if self.centroids is not None:
+            probe = np.argsort(-(self.centroids @ query))[:n_probe]
+            candidate_mask = np.isin(self.list_assignments, probe)
+            mask = candidate_mask if mask is None else (mask & candidate_mask)
+
+        if mask is None:
+            candidates = np.arange(len(self.track_ids))
+            scores = self.embeddings @ query
+        else:
+            candidates = np.nonzero(mask)[0]
+            scores = self.embeddings[candidates] @ query
+
+        if len(candidates) == 0:
+            return []
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.track_ids[candidates[i]], float(scores[i])) for i in top]
+
+    def similar_tracks(self, track_id: str, k: int = 10, match_bpm: bool = False,
+                       match_key: bool = False, bpm_tolerance: float = 0.06) -> List[Tuple[str, float]]:
+        """指定曲に似た曲を検索（自分自身は除く）"""
+        position = self.position_of[track_id]
+        bpm = float(self.bpms[position]) if match_bpm and self.bpms[position] > 0 else None
+        key = None
+        if match_key and self.key_pitch[position] >= 0:
+            key = (int(self.key_pitch[position]), bool(self.key_minor[position]))
+
+        mask = self.filter_mask(bpm=bpm, bpm_tolerance=bpm_tolerance, key=key)
+        mask[position] = False
+        return self.search(self.embeddings[position], k=k, mask=mask)
+
+    def save(self, file_path: str):
+        """インデックスをnpzで保存"""
+        np.savez(file_path,
+                 track_ids=np.array(self.track_ids, dtype=str),
+                 embeddings=self.embeddings,
+                 bpms=self.bpms,
+                 key_pitch=self.key_pitch,
+                 key_minor=self.key_minor)
+
+    @classmethod
+    def load(cls, file_path: str) -> 'TrackEmbeddingIndex':
+        """保存済みのインデックスを読み込む"""
+        with np.load(file_path) as data:
+            return cls([str(t) for t in data['track_ids']], data['embeddings'],
+                       data['bpms'], data['key_pitch'], data['key_minor'])
+
+    @classmethod
+    def from_library(cls, parser: RekordboxXMLParser, cache: AudioFeatureCache,
+                     tracks: Optional[List[Dict]] = None, cached_only: bool = False) -> 'TrackEmbeddingIndex':
+        """コレクションの曲から埋め込みインデックスを作成"""
+        if tracks is None:
+            tracks = parser.get_all_tracks()
+
+        track_ids = []
+        embeddings = []
+        bpms = []
+        key_pitch = []
+        key_minor = []
+        for track in tracks:
+            if not track.get('Location'):
+                continue
+            try:
+                if cached_only:
+                    features = cache.get_cached_features(track['Location'])
+                    if features is None:
+                        continue
+                else:
+                    features = cache.get_features(track['Location'])
+            except Exception as e:
+                print(f"❌ 特徴量を取得できませんでした: {track['Name']} ({e})")
+                continue
+
+            key = tonality_to_key(track.get('Tonality'))
+            track_ids.append(track['TrackID'])
+            embeddings.append(compute_embedding(features))
+            bpms.append(float(track['AverageBpm']) if track.get('AverageBpm') else 0.0)
+            key_pitch.append(key[0] if key else -1)
+            key_minor.append(key[1] if key else False)
+
+        matrix = np.vstack(embeddings) if embeddings else np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        return cls(track_ids, matrix, np.array(bpms), np.array(key_pitch), np.array(key_minor))
+
+
+# 使用例
+if __name__ == "__main__":
+    xml_path = "rekordbox_analyzer/rekordbox_xml/collections.xml"
+
+    parser = RekordboxXMLParser(xml_path)
+    cache = AudioFeatureCache("rekordbox_analyzer/feature_cache")
+    index = TrackEmbeddingIndex.from_library(parser, cache, cached_only=True)
+
+    seed_id = "109686241"
+    if seed_id in index.position_of:
+        print(f"🎧 {seed_id} に似た曲（BPM・キー互換）:")
+        for track_id, score in index.similar_tracks(seed_id, k=10, match_bpm=True, match_key=True):
+            track = parser.get_track_by_id(track_id)
+            print(f"   {score:.3f}  {track['Artist']} - {track['Name']} ({track['AverageBpm']} BPM, {track['Tonality']})")
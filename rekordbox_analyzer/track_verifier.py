@@ -0,0 +1,294 @@
+import numpy as np
+import re
+from typing import Dict, List, Optional, Tuple
+
+from rekordbox_xml_parser import RekordboxXMLParser
+from audio_feature_cache import AudioFeatureCache
+from audio_spectrum_visualizer import PITCH_CLASSES
+
+FLAT_NAMES = {'Db': 1, 'Eb': 3, 'Gb': 6, 'Ab': 8, 'Bb': 10, 'Cb': 11, 'Fb': 4}
+
+# Krumhansl-Schmuckler のキープロファイル
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+
+def _zscore(x: np.ndarray) -> np.ndarray:
+    """最後の軸で標準化"""
+    x = x - x.mean(axis=-1, keepdims=True)
+    std = x.std(axis=-1, keepdims=True)
+    return x / np.where(std > 0, std, 1)
+
+
+def _build_key_templates() -> np.ndarray:
+    """24調（長調12 + 短調12）のテンプレート行列を作成"""
+    shifts = np.arange(12)
+    index = (np.arange(12)[None, :] - shifts[:, None]) % 12
+    templates = np.vstack([MAJOR_PROFILE[index], MINOR_PROFILE[index]])
+    return _zscore(templates)
+
+
+KEY_TEMPLATES = _build_key_templates()
+
+
+def tonality_to_key(tonality: Optional[str]) -> Optional[Tuple[int, bool]]:
+    """rekordboxのTonality（"Am" / "F#" / "8A" など）を (ピッチクラス, 短調か) に変換"""
+    if not tonality:
+        return None
+    tonality = tonality.strip()
+
+    # Camelot表記 (1A〜12B)
+    camelot = re.fullmatch(r'(\d{1,2})([AaBb])', tonality)
+    if camelot:
+        number = int(camelot.group(1))
+        if not 1 <= number <= 12:
+            return None
+        major_pc = (11 + 7 * (number - 1)) % 12
+        if camelot.group(2).upper() == 'A':
+            return (major_pc + 9) % 12, True
+        return major_pc, False
+
+    # 音名表記 (C, F#m, Bbm, A minor など)
+    match = re.fullmatch(r'([A-Ga-g])([#b]?)\s*(m|min|minor|maj|major)?', tonality)
+    if not match:
+        return None
+    name = match.group(1).upper() + match.group(2)
+    if name in FLAT_NAMES:
+        pitch_class = FLAT_NAMES[name]
+    elif name in PITCH_CLASSES:
+        pitch_class = PITCH_CLASSES.index(name)
+    else:
+        return None
+    is_minor = match.group(3) in ('m', 'min', 'minor')
+    return pitch_class, is_minor
+
+
+def format_key(pitch_class: int, is_minor: bool) -> str:
+    """(ピッチクラス, 短調か) をrekordbox風の表記に変換"""
+    return PITCH_CLASSES[pitch_class] + ('m' if is_minor else '')
+
+
+def estimate_keys(chroma_profiles: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(N, 12) のクロマ平均プロファイルからキーを一括推定
+
+    戻り値は (ピッチクラス配列, 短調フラグ配列, 相関スコア配列)。
+    """
+    profiles = _zscore(np.atleast_2d(chroma_profiles).astype(np.float64))
+    scores = profiles @ KEY_TEMPLATES.T / 12
+    best = scores.argmax(axis=1)
+    return best % 12, best >= 12, scores[np.arange(len(best)), best]
+
+
+def beat_grid(tempo_list: List[Dict], duration: float) -> Tuple[np.ndarray, np.ndarray]:
+    """rekordboxのTEMPOリストから拍位置（秒）と小節内の拍番号（0始まり）の配列を生成"""
+    starts = np.array([float(t['Inizio']) for t in tempo_list])
+    intervals = 60.0 / np.array([float(t['Bpm']) for t in tempo_list])
+    first_beats = np.array([int(t.get('Battito') or 1) - 1 for t in tempo_list])
+    beats_per_bar = np.array([int((t.get('Metro') or '4/4').split('/')[0]) for t in tempo_list])
+    ends = np.append(starts[1:], max(duration, starts[-1]))
+
+    counts = np.maximum(np.ceil((ends - starts) / intervals).astype(np.int64), 1)
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    beat_index = np.arange(counts.sum()) - offsets
+    times = np.repeat(starts, counts) + beat_index * np.repeat(intervals, counts)
+    beat_in_bar = (np.repeat(first_beats, counts) + beat_index) % np.repeat(beats_per_bar, counts)
+    return times, beat_in_bar
+
+
+def beat_grid_times(tempo_list: List[Dict], duration: float) -> np.ndarray:
+    """rekordboxのTEMPOリストから拍位置（秒）の配列を生成"""
+    return beat_grid(tempo_list, duration)[0]
+
+
+def grid_offsets(beat_times: np.ndarray, grid_times: np.ndarray) -> np.ndarray:
+    """検出した拍ごとに最も近いグリッド拍とのずれ（秒）を求める"""
+    right = np.clip(np.searchsorted(grid_times, beat_times), 1, len(grid_times) - 1)
+    left = right - 1
+    left_offsets = beat_times - grid_times[left]
+    right_offsets = beat_times - grid_times[right]
+    return np.where(np.abs(left_offsets) <= np.abs(right_offsets), left_offsets, right_offsets)
+
+
+def estimate_tempo(features: Dict[str, np.ndarray]) -> Tuple[float, np.ndarray]:
+    """キャッシュ済み特徴量のオンセット強度からテンポと拍位置（秒）を推定"""
+    import librosa
+
+    sr = int(features['sr'])
+    hop_length = int(features['hop_length'])
+    _, beat_times = librosa.beat.beat_track(onset_envelope=features['onset_env'],
+                                            sr=sr, hop_length=hop_length, units='time')
+    if len(beat_times) < 2:
+        return 0.0, beat_times
+
+    # 拍番号に対する回帰でフレーム分解能より細かく拍間隔を求める
+    period = np.polyfit(np.arange(len(beat_times)), beat_times, 1)[0]
+    return 60.0 / period, beat_times
+
+
+class TrackVerifier:
+    def __init__(self, parser: RekordboxXMLParser, cache: AudioFeatureCache,
+                 bpm_tolerance: float = 0.015, grid_tolerance_ms: float = 25.0):
+        """rekordboxのBPM・ビートグリッド・キーを音声解析結果と照合する"""
+        self.parser = parser
+        self.cache = cache
+        self.bpm_tolerance = bpm_tolerance
+        self.grid_tolerance_ms = grid_tolerance_ms
+
+    def estimate_tempo(self, features: Dict[str, np.ndarray]) -> Tuple[float, np.ndarray]:
+        """オンセット強度からテンポと拍位置（秒）を推定"""
+        return estimate_tempo(features)
+
+    def _check_bpm(self, estimated_bpm: float, average_bpm: Optional[str]) -> Tuple[Optional[float], bool]:
+        """倍・半分テンポを許容してBPMの相対誤差を判定"""
+        if not average_bpm or estimated_bpm <= 0:
+            return None, True
+        reference = float(average_bpm)
+        if reference <= 0:
+            return None, True
+        candidates = estimated_bpm * np.array([1.0, 2.0, 0.5])
+        error = float(np.min(np.abs(candidates - reference)) / reference)
+        return error, error <= self.bpm_tolerance
+
+    def _check_grid(self, beat_times: np.ndarray, tempo_list: Optional[List[Dict]],
+                    duration: float) -> Tuple[Optional[float], Optional[float], bool]:
+        """ビートグリッドとのずれ（中央値）と曲全体でのドリフト量をミリ秒で返す"""
+        if not tempo_list or len(beat_times) < 8:
+            return None, None, True
+
+        grid_times = beat_grid_times(tempo_list, duration)
+        if len(grid_times) < 2:
+            return None, None, True
+
+        offsets = grid_offsets(beat_times, grid_times)
+        median_offset_ms = float(np.median(np.abs(offsets)) * 1000)
+        slope = np.polyfit(beat_times, offsets, 1)[0]
+        drift_ms = float(slope * (beat_times[-1] - beat_times[0]) * 1000)
+
+        ok = median_offset_ms <= self.grid_tolerance_ms and abs(drift_ms) <= self.grid_tolerance_ms
+        return median_offset_ms, drift_ms, ok
+
+    def _check_key(self, pitch_class: int, is_minor: bool, tonality: Optional[str]) -> str:
+        """推定キーとTonalityを比較（一致 / 平行調 / 不一致 / 不明）"""
+        reference = tonality_to_key(tonality)
+        if reference is None:
+            return 'unknown'
+        if reference == (pitch_class, is_minor):
+            return 'match'
+
+        ref_pc, ref_minor = reference
+        if ref_minor != is_minor:
+            relative_pc = (ref_pc + 3) % 12 if ref_minor else (ref_pc + 9) % 12
+            if relative_pc == pitch_class:
+                return 'relative'
+        return 'mismatch'
+
+    def _verify_rhythm(self, track_info: Dict, features: Dict[str, np.ndarray]) -> Dict:
+        """1曲分のBPM・ビートグリッドの照合結果を作成（キーは _apply_key で追加）"""
+        estimated_bpm, beat_times = self.estimate_tempo(features)
+        bpm_error, bpm_ok = self._check_bpm(estimated_bpm, track_info.get('AverageBpm'))
+        grid_offset_ms, grid_drift_ms, grid_ok = self._check_grid(
+            beat_times, track_info.get('TEMPO'), float(features['duration']))
+
+        issues = []
+        if not bpm_ok:
+            issues.append('bpm')
+        if not grid_ok:
+            issues.append('grid')
+
+        return {
+            'TrackID': track_info['TrackID'],
+            'Name': track_info['Name'],
+            'Artist': track_info['Artist'],
+            'AverageBpm': track_info.get('AverageBpm'),
+            'EstimatedBpm': round(estimated_bpm, 2),
+            'BpmError': bpm_error,
+            'GridOffsetMs': grid_offset_ms,
+            'GridDriftMs': grid_drift_ms,
+            'Tonality': track_info.get('Tonality'),
+            'Issues': issues,
+        }
+
+    def _apply_key(self, result: Dict, pitch_class: int, is_minor: bool, key_score: float):
+        """推定キーとTonalityの照合結果を追加"""
+        key_status = self._check_key(pitch_class, is_minor, result['Tonality'])
+        result['EstimatedKey'] = format_key(pitch_class, is_minor)
+        result['KeyScore'] = key_score
+        result['KeyStatus'] = key_status
+        if key_status == 'mismatch':
+            result['Issues'].append('key')
+
+    def verify_track(self, track_info: Dict) -> Dict:
+        """1曲を照合"""
+        features = self.cache.get_features(track_info['Location'])
+        result = self._verify_rhythm(track_info, features)
+        pitch_classes, minors, scores = estimate_keys(features['chroma'].mean(axis=1))
+        self._apply_key(result, int(pitch_classes[0]), bool(minors[0]), float(scores[0]))
+        return result
+
+    def verify_library(self, tracks: Optional[List[Dict]] = None, cached_only: bool = False) -> List[Dict]:
+        """ライブラリ全体をバッチで照合
+
+        cached_only=True の場合は特徴量キャッシュがある曲だけを対象にする。
+        BPM・グリッドは1曲ずつ照合して特徴量をすぐ解放し、曲ごとに残すのは
+        12次元のクロマ平均だけにする。キー推定はそれらをまとめて1回の行列積で行う。
+        """
+        if tracks is None:
+            tracks = self.parser.get_all_tracks()
+
+        results = []
+        profiles = []
+        for track in tracks:
+            if not track.get('Location'):
+                continue
+            try:
+                if cached_only:
+                    features = self.cache.get_cached_features(track['Location'])
+                    if features is None:
+                        continue
+                else:
+                    features = self.cache.get_features(track['Location'])
+                result = self._verify_rhythm(track, features)
+            except Exception as e:
+                print(f"❌ 照合できませんでした: {track['Name']} ({e})")
+                continue
+            results.append(result)
+            profiles.append(features['chroma'].mean(axis=1))
+            del features
+
+        if not results:
+            return []
+
+        pitch_classes, minors, scores = estimate_keys(np.stack(profiles))
+        for i, result in enumerate(results):
+            self._apply_key(result, int(pitch_classes[i]), bool(minors[i]), float(scores[i]))
+        return results
+
+    def display_report(self, results: List[Dict]):
+        """照合結果のうち問題のある曲を表示"""
+        flagged = [r for r in results if r['Issues']]
+
+        print("=" * 80)
+        print(f"🔍 BPM・キー照合レポート ({len(flagged)}/{len(results)} 曲に問題あり)")
+        print("=" * 80)
+
+        for result in flagged:
+            print(f"🎵 {result['Artist']} - {result['Name']} (ID: {result['TrackID']})")
+            if 'bpm' in result['Issues']:
+                print(f"   ⚠️  BPM    : rekordbox {result['AverageBpm']} / 推定 {result['EstimatedBpm']}")
+            if 'grid' in result['Issues']:
+                print(f"   ⚠️  グリッド: ずれ {result['GridOffsetMs']:.1f} ms / ドリフト {result['GridDriftMs']:+.1f} ms")
+            if 'key' in result['Issues']:
+                print(f"   ⚠️  キー   : rekordbox {result['Tonality']} / 推定 {result['EstimatedKey']}")
+        print("=" * 80)
+
+
+# 使用例
+if __name__ == "__main__":
+    xml_path = "rekordbox_analyzer/rekordbox_xml/collections.xml"
+
+    parser = RekordboxXMLParser(xml_path)
+    cache = AudioFeatureCache("rekordbox_analyzer/feature_cache")
+    verifier = TrackVerifier(parser, cache)
+
+    results = verifier.verify_library(parser.get_tracks_by_artist("LiSA"))
+    verifier.display_report(results)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""タイムライン・rekordbox・オーディオ解析の統合コマンドライン
+
+重い依存ライブラリ（librosa / matplotlib / folium / numpy）は
+各サブコマンドの処理内でのみ読み込むため、--help や単純な検索はすぐに終わる。
+
+使用例:
+    python util_cli.py timeline list --start 2025-08-12 --end 2025-08-15
+    python util_cli.py timeline map --output travel_map.html
+    python util_cli.py rekordbox track --id 109686241
+    python util_cli.py rekordbox track --path "/Volumes/NO NAME/iTunes/.../02 oath sign.m4a"
+    python util_cli.py audio analyze "/path/to/track.m4a" --save --no-show
+"""
+import argparse
+import sys
+from datetime import date
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT_DIR / 'rekordbox_analyzer'))
+sys.path.insert(0, str(ROOT_DIR / 'create_map_timeline'))
+
+DEFAULT_XML_PATH = "rekordbox_analyzer/rekordbox_xml/collections.xml"
+DEFAULT_TIMELINE_PATH = "create_map_timeline/location-history.json"
+DEFAULT_FEATURE_CACHE_DIR = "rekordbox_analyzer/feature_cache"
+DEFAULT_GEOCODE_CACHE_PATH = "create_map_timeline/geocode_cache.json"
+
+
+def _parse_date(value: str) -> date:
+    """YYYY-MM-DD 形式の日付を読み込む"""
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日付は YYYY-MM-DD 形式で指定してください: {value}")
+
+
+# ---- timeline ----
+
+def cmd_timeline_list(args):
+    """期間内の訪問場所を一覧表示"""
+    from simple_travel_map import SimpleTravelMap
+
+    travel_map = SimpleTravelMap(args.file)
+    if args.gazetteer:
+        travel_map.label_unknown_places(args.gazetteer, args.geocode_cache)
+    places = travel_map.filter_by_date(args.start, args.end)
+    for i, place in enumerate(places, 1):
+        print(f"{i:4d}. {travel_map.format_time(place['time'])}  {place['name']}  ({place['lat']:.5f}, {place['lng']:.5f})")
+    print(f"\n📊 訪問場所数: {len(places)}箇所")
+
+
+def cmd_timeline_map(args):
+    """旅行マップHTMLを作成"""
+    from simple_travel_map import create_travel_map
+
+    create_travel_map(args.file, args.output, start_date=args.start, end_date=args.end,
+                      gazetteer_file=args.gazetteer, geocode_cache_file=args.geocode_cache)
+
+
+# ---- rekordbox ----
+
+def cmd_rekordbox_track(args):
+    """rekordboxコレクションから曲を検索して表示"""
+    from rekordbox_xml_parser import RekordboxXMLParser
+
+    parser = RekordboxXMLParser(args.xml)
+    if args.id:
+        track = parser.get_track_by_id(args.id)
+        tracks = [track] if track else []
+    elif args.path:
+        from find_track_by_filepath import TrackByFilePathFinder
+
+        finder = TrackByFilePathFinder(args.xml, parser=parser)
+        track = finder.find_track_by_filepath(args.path)
+        tracks = [track] if track else []
+    elif args.artist:
+        tracks = parser.get_tracks_by_artist(args.artist)
+    else:
+        tracks = parser.get_tracks_by_name(args.name)
+
+    if not tracks:
+        print("❌ 該当する楽曲が見つかりませんでした。")
+        return 1
+
+    for track in tracks[:args.limit]:
+        parser.display_track_info(track)
+    if len(tracks) > args.limit:
+        print(f"... 他 {len(tracks) - args.limit} 曲")
+    return 0
+
+
+def cmd_rekordbox_playlist(args):
+    """プレイリストの一覧・内容・逆引きを表示"""
+    from rekordbox_xml_parser import RekordboxXMLParser
+
+    parser = RekordboxXMLParser(args.xml)
+    if args.track_id:
+        paths = parser.get_playlists_for_track(args.track_id)
+        print(f"🎵 TrackID {args.track_id} を含むプレイリスト: {len(paths)}件")
+        for path in paths:
+            print(f"   {path}")
+    elif args.path:
+        for track in parser.get_playlist_tracks(args.path):
+            print(f"   {track['TrackID']}: {track['Artist']} - {track['Name']}")
+    else:
+        for path in parser.get_playlist_names():
+            print(f"   {path} ({len(parser.playlists[path])}曲)")
+    return 0
+
+
+# ---- audio ----
+
+def _select_tracks(parser, artist):
+    """アーティスト指定があれば絞り込んだ曲リストを返す"""
+    return parser.get_tracks_by_artist(artist) if artist else parser.get_all_tracks()
+
+
+def cmd_audio_analyze(args):
+    """オーディオファイルのスペクトラム分析"""
+    from audio_spectrum_visualizer import AudioSpectrumVisualizer
+
+    visualizer = AudioSpectrumVisualizer()
+    visualizer.analyze_audio_file(args.file, show_plots=not args.no_show,
+                                  save_plots=args.save, output_dir=args.output_dir)
+
+
+def cmd_audio_thumbnails(args):
+    """コレクションの曲のサムネイルPNGを一括生成"""
+    from rekordbox_xml_parser import RekordboxXMLParser
+    from spectrum_thumbnail_renderer import SpectrumThumbnailRenderer
+
+    parser = RekordboxXMLParser(args.xml)
+    locations = [t['Location'] for t in _select_tracks(parser, args.artist) if t.get('Location')]
+
+    renderer = SpectrumThumbnailRenderer(width_px=args.width, height_px=args.height)
+    results = renderer.render_batch(locations, output_dir=args.output_dir)
+    renderer.close()
+
+    succeeded = sum(1 for saved in results.values() if saved)
+    print(f"\n✅ {succeeded}/{len(results)} 曲のサムネイルを生成しました")
+
+
+def cmd_audio_verify(args):
+    """BPM・ビートグリッド・キーをrekordboxの情報と照合"""
+    from rekordbox_xml_parser import RekordboxXMLParser
+    from audio_feature_cache import AudioFeatureCache
+    from track_verifier import TrackVerifier
+
+    parser = RekordboxXMLParser(args.xml)
+    verifier = TrackVerifier(parser, AudioFeatureCache(args.cache_dir))
+    results = verifier.verify_library(_select_tracks(parser, args.artist), cached_only=args.cached_only)
+    verifier.display_report(results)
+
+
+def cmd_audio_cues(args):
+    """キューのない曲にフレーズ境界からキューを提案してXMLに書き出す"""
+    from rekordbox_xml_parser import RekordboxXMLParser
+    from audio_feature_cache import AudioFeatureCache
+    from cue_point_detector import CuePointDetector
+    from rekordbox_xml_writer import RekordboxXMLWriter
+
+    parser = RekordboxXMLParser(args.xml)
+    detector = CuePointDetector(AudioFeatureCache(args.cache_dir))
+    results = detector.detect_library(_select_tracks(parser, args.artist), cached_only=args.cached_only)
+
+    writer = RekordboxXMLWriter(args.xml)
+    for track_id, marks in results.items():
+        writer.add_position_marks(track_id, marks)
+    updated = writer.write(args.output)
+    print(f"✅ {len(updated)} 曲にキューを追加しました: {args.output}")
+
+
+# ---- serve ----
+
+def cmd_serve(args):
+    """常駐型のローカル検索サーバーを起動"""
+    from query_server import QueryServer
+
+    QueryServer(xml_file_path=args.xml, timeline_file=args.timeline,
+                host=args.host, port=args.port, poll_interval=args.poll_interval,
+                gazetteer_file=args.gazetteer, geocode_cache_file=args.geocode_cache).run()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """コマンドライン引数の定義"""
+    parser = argparse.ArgumentParser(description="タイムライン・rekordbox・オーディオ解析ツール")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    # timeline
+    timeline = subparsers.add_parser('timeline', help="Googleタイムライン")
+    timeline_sub = timeline.add_subparsers(dest='action', required=True)
+
+    timeline_list = timeline_sub.add_parser('list', help="期間内の訪問場所を一覧表示")
+    timeline_map = timeline_sub.add_parser('map', help="旅行マップHTMLを作成")
+    for sub in (timeline_list, timeline_map):
+        sub.add_argument('--file', default=DEFAULT_TIMELINE_PATH, help="タイムラインJSONファイル")
+        sub.add_argument('--start', type=_parse_date, help="開始日 (YYYY-MM-DD)")
+        sub.add_argument('--end', type=_parse_date, help="終了日 (YYYY-MM-DD)")
+        sub.add_argument('--gazetteer', help="名前のない場所に使う地名ファイル (GeoNames形式)")
+        sub.add_argument('--geocode-cache', default=DEFAULT_GEOCODE_CACHE_PATH, help="地名検索結果のキャッシュJSON")
+    timeline_map.add_argument('--output', default='travel_map.html', help="出力HTMLファイル")
+    timeline_list.set_defaults(func=cmd_timeline_list)
+    timeline_map.set_defaults(func=cmd_timeline_map)
+
+    # rekordbox
+    rekordbox = subparsers.add_parser('rekordbox', help="rekordboxコレクション")
+    rekordbox_sub = rekordbox.add_subparsers(dest='action', required=True)
+
+    track = rekordbox_sub.add_parser('track', help="曲を検索して表示")
+    track.add_argument('--xml', default=DEFAULT_XML_PATH, help="rekordboxのXMLファイル")
+    track.add_argument('--limit', type=int, default=10, help="表示する最大曲数")
+    query = track.add_mutually_exclusive_group(required=True)
+    query.add_argument('--id', help="TrackID")
+    query.add_argument('--path', help="ファイルパスまたはLocation")
+    query.add_argument('--artist', help="アーティスト名（部分一致）")
+    query.add_argument('--name', help="曲名（部分一致）")
+    track.set_defaults(func=cmd_rekordbox_track)
+
+    playlist = rekordbox_sub.add_parser('playlist', help="プレイリストを表示")
+    playlist.add_argument('--xml', default=DEFAULT_XML_PATH, help="rekordboxのXMLファイル")
+    playlist_query = playlist.add_mutually_exclusive_group()
+    playlist_query.add_argument('--path', help="プレイリストまたはフォルダのパス（例: \"Folder/List\"）")
+    playlist_query.add_argument('--track-id', help="このTrackIDを含むプレイリストを表示")
+    playlist.set_defaults(func=cmd_rekordbox_playlist)
+
+    # audio
+    audio = subparsers.add_parser('audio', help="オーディオ解析")
+    audio_sub = audio.add_subparsers(dest='action', required=True)
+
+    analyze = audio_sub.add_parser('analyze', help="スペクトラム分析")
+    analyze.add_argument('file', help="オーディオファイルのパスまたはLocation")
+    analyze.add_argument('--save', action='store_true', help="画像を保存する")
+    analyze.add_argument('--no-show', action='store_true', help="画像を表示しない")
+    analyze.add_argument('--output-dir', default='spectrum_output', help="画像の保存先")
+    analyze.set_defaults(func=cmd_audio_analyze)
+
+    thumbnails = audio_sub.add_parser('thumbnails', help="サムネイルPNGを一括生成")
+    thumbnails.add_argument('--xml', default=DEFAULT_XML_PATH, help="rekordboxのXMLファイル")
+    thumbnails.add_argument('--artist', help="対象アーティスト（部分一致）")
+    thumbnails.add_argument('--output-dir', default='thumbnail_output', help="画像の保存先")
+    thumbnails.add_argument('--width', type=int, default=800, help="画像の幅 (px)")
+    thumbnails.add_argument('--height', type=int, default=240, help="画像の高さ (px)")
+    thumbnails.set_defaults(func=cmd_audio_thumbnails)
+
+    verify = audio_sub.add_parser('verify', help="BPM・グリッド・キーを照合")
+    verify.add_argument('--xml', default=DEFAULT_XML_PATH, help="rekordboxのXMLファイル")
+    verify.add_argument('--artist', help="対象アーティスト（部分一致）")
+    verify.add_argument('--cache-dir', default=DEFAULT_FEATURE_CACHE_DIR, help="特徴量キャッシュの保存先")
+    verify.add_argument('--cached-only', action='store_true', help="キャッシュ済みの曲のみ照合する")
+    verify.set_defaults(func=cmd_audio_verify)
+
+    cues = audio_sub.add_parser('cues', help="キューのない曲にキューを提案")
+    cues.add_argument('--xml', default=DEFAULT_XML_PATH, help="rekordboxのXMLファイル")
+    cues.add_argument('--output', required=True, help="キューを追加したXMLの出力先")
+    cues.add_argument('--artist', help="対象アーティスト（部分一致）")
+    cues.add_argument('--cache-dir', default=DEFAULT_FEATURE_CACHE_DIR, help="特徴量キャッシュの保存先")
+    cues.add_argument('--cached-only', action='store_true', help="キャッシュ済みの曲のみ対象にする")
+    cues.set_defaults(func=cmd_audio_cues)
+
+    # serve
+    serve = subparsers.add_parser('serve', help="常駐型のローカル検索サーバーを起動")
+    serve.add_argument('--xml', default=DEFAULT_XML_PATH, help="rekordboxのXMLファイル")
+    serve.add_argument('--timeline', default=DEFAULT_TIMELINE_PATH, help="タイムラインJSONファイル")
+    serve.add_argument('--host', default='127.0.0.1', help="待ち受けアドレス")
+    serve.add_argument('--port', type=int, default=8765, help="待ち受けポート")
+    serve.add_argument('--poll-interval', type=float, default=2.0, help="ファイル更新の確認間隔（秒）")
+    serve.add_argument('--gazetteer', help="名前のない場所に使う地名ファイル (GeoNames形式)")
+    serve.add_argument('--geocode-cache', default=DEFAULT_GEOCODE_CACHE_PATH, help="地名検索結果のキャッシュJSON")
+    serve.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args) or 0
+    except Exception as e:
+        print(f"エラー: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())